@@ -0,0 +1,135 @@
+# attitudeTools.py - resident spacecraft attitude quaternions
+"""
+attitudeTools is a python module that serves the spacecraft attitude quaternions of the
+mission (quats.npy, or the allQuats.txt it was made from) to the frame conversions.
+
+The quaternion file is opened once per process and memory mapped; only the GPS column is
+held in memory, as a sorted time index. The quaternion of a GPS time is found with a
+binary search of that index, either the nearest sample (as the old argmin over the whole
+file) or a SLERP between the two samples around the time. All queries take a single GPS
+time or an array of them, so the frames of a whole catalog are looked up in one call.
+
+File layout: one row per sample, [gps, q1, q2, q3, q4] with the scalar part last.
+"""
+
+import os
+
+import numpy as np
+
+# quaternion file -> attitude
+_attitudes = {}
+
+
+def getAttitude(quatFile, doText = False):
+	"""
+	Returns the attitude service of a quaternion file, opened once and shared by the whole
+	process.
+		quatFile = path to quats.npy (or allQuats.txt if doText)
+		doText = the file is an ASCII text file
+	"""
+	key = os.path.abspath(quatFile)
+	if key not in _attitudes:
+		_attitudes[key] = attitude(quatFile, doText = doText)
+	return _attitudes[key]
+
+
+def slerp(q0, q1, tau):
+	"""
+	Spherical linear interpolation between unit quaternions.
+	Arguments
+		q0, q1 = float arrays [n x 4] (w, x, y, z)
+		tau = array [n] of interpolation fractions (0 gives q0, 1 gives q1)
+	Returns float array [n x 4]
+	"""
+	tau = np.asarray(tau, dtype = float)[:, np.newaxis]
+	dot = np.sum(q0 * q1, axis = 1)
+
+	# take the short way round
+	q1 = np.where(dot[:, np.newaxis] < 0, -q1, q1)
+	dot = np.abs(dot)
+
+	theta = np.arccos(np.clip(dot, -1, 1))[:, np.newaxis]
+	sin = np.sin(theta)
+	near = (sin < 1e-9)[:, 0]
+	sin[near] = 1
+	w0 = np.where(near[:, np.newaxis], 1 - tau, np.sin((1 - tau) * theta) / sin)
+	w1 = np.where(near[:, np.newaxis], tau, np.sin(tau * theta) / sin)
+	q = w0 * q0 + w1 * q1
+	return q / np.sqrt(np.sum(q * q, axis = 1))[:, np.newaxis]
+
+
+class attitude:
+	"""
+	Spacecraft attitude of the whole mission, queried by GPS time
+	"""
+
+	def __init__(self, quatFile, doText = False):
+		"""
+			quatFile = path to quats.npy (or allQuats.txt if doText)
+			doText = the file is an ASCII text file, parsed once
+		"""
+		self.quatFile = quatFile
+		if doText:
+			from chainTools import readChain
+			self.dat = readChain(quatFile, burnIn = 0)
+		else:
+			self.dat = np.load(quatFile, mmap_mode = 'r')
+
+		# sorted time index, with the rows of the file in that order if it is not sorted
+		gps = np.array(self.dat[:, 0])
+		if np.all(np.diff(gps) >= 0):
+			self.order = None
+			self.gps = gps
+		else:
+			self.order = np.argsort(gps, kind = 'mergesort')
+			self.gps = gps[self.order]
+
+	def __len__(self):
+		return len(self.gps)
+
+	def rows(self, i):
+		""" Returns the quaternions [n x 4] (w, x, y, z) of samples i of the time index """
+		if self.order is not None:
+			i = self.order[i]
+		dat = self.dat[np.asarray(i)]
+		return np.array(dat[..., [4, 1, 2, 3]], dtype = float)
+
+	def nearest(self, gps):
+		""" Returns the index of the sample nearest to each GPS time (the earlier one on a tie) """
+		gps = np.asarray(gps, dtype = float)
+		if len(self.gps) == 1:
+			return np.zeros(gps.shape, dtype = int)
+		i = np.clip(np.searchsorted(self.gps, gps), 1, len(self.gps) - 1)
+		before = self.gps[i - 1]
+		after = self.gps[i]
+		return np.where(gps - before <= after - gps, i - 1, i)
+
+	def getQuatArray(self, gps, interpolate = False):
+		"""
+		Returns the attitude quaternions as a float array [n x 4] (w, x, y, z).
+			gps = GPS time or array of GPS times
+			interpolate = SLERP between the samples around each time instead of taking
+				the nearest sample; times outside the file get the first or last sample
+		"""
+		gps = np.atleast_1d(np.asarray(gps, dtype = float))
+		if not interpolate or len(self.gps) < 2:
+			return self.rows(self.nearest(gps))
+
+		i = np.clip(np.searchsorted(self.gps, gps, side = 'right'), 1, len(self.gps) - 1)
+		t0 = self.gps[i - 1]
+		t1 = self.gps[i]
+		tau = np.clip((gps - t0) / np.where(t1 > t0, t1 - t0, 1), 0, 1)
+		return slerp(self.rows(i - 1), self.rows(i), tau)
+
+	def getQuats(self, gps, interpolate = False):
+		"""
+		Returns the attitude quaternions (rotation from SC to ECI) at the GPS times, as a
+		quaternion for a single time or a quaternion array for an array of times.
+			interpolate = SLERP between samples, see getQuatArray
+		"""
+		import quaternion
+
+		q = quaternion.as_quat_array(self.getQuatArray(gps, interpolate = interpolate))
+		if np.ndim(gps) == 0:
+			return q[0]
+		return q
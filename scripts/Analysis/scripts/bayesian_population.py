@@ -1,7 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from populationClass import population as pop
-from impactClass import impactClass
+from populationClass import populationSet
+from impactClass import impactClass, batchSCtoSun
 from impactClass import impactClassList
 import pathlib
 import os 
@@ -28,9 +29,10 @@ def getGRSSegments(filenames, grs = 1):
         return segments
 
 
-def redefine(dataDir = '/data', saveDir = '/FLUX_IMPACTS_ALL',usePtot=True):
+def redefine(dataDir = '/data', saveDir = '/FLUX_IMPACTS_ALL',usePtot=True, chunkSize = 32):
         """
         Creates .npy files used in the analysis
+        chunkSize = number of impacts read and converted to the sun frame at a time
 
         """
         dataPath = pathlib.Path(BASE_DIR + dataDir)
@@ -50,6 +52,7 @@ def redefine(dataDir = '/data', saveDir = '/FLUX_IMPACTS_ALL',usePtot=True):
                                         pop(modelDir, 'AST', usePtot),
                                         pop(modelDir, 'OCC', usePtot),
                                         pop(modelDir, 'Uniform', usePtot)]
+        popSet = populationSet(populations)
 
         pickles = list(impact_dir.glob('*_grs1.pickle'))
 
@@ -63,24 +66,37 @@ def redefine(dataDir = '/data', saveDir = '/FLUX_IMPACTS_ALL',usePtot=True):
         write_file.write('Making numpy files')
         write_file.write('\n')
 
-        i = -1
+        # Segments that have no numpy file yet
+        segments = []
         for p in pickles:
-                        i += 1
                         segment = str(p.stem[0:10])
-                        print(segment, i * 100 / len(pickles), '%')
-                        write_file.write(segment + '\n')
                         file_numpy = str(save_dir) + '/' + segment + '_grs%i.npy'%(grs)
-
                         if os.path.isfile(file_numpy):
-                                print("Exists")
+                                print(segment, "Exists")
                                 continue
-                        chainFile = str(impact_dir) + '/' + str(segment) +'_grs%i'%grs + '.pickle'
+                        segments.append(segment)
 
-                        # Initialize Impact
-                        impact = impactClass(chainFile)
+        # Impacts are read and converted to the sun frame chunkSize at a time, the numpy
+        # files of a chunk are written before the next one is read
+        i = -1
+        for start in range(0, len(segments), chunkSize):
+                impacts = []
+                for segment in segments[start:start + chunkSize]:
+                        chainFile = str(impact_dir) + '/' + str(segment) +'_grs%i'%grs + '.pickle'
+                        impact = impactClass(chainFile, lazy = True)
                         impact.segment = int(segment)
-                        impact = impact.SCtoSun()
-                        impact = impact.findSkyAngles()
+                        impacts.append(impact)
+
+                print("Converting to sun frame")
+                batchSCtoSun(impacts)
+
+                for impact in impacts:
+                        i += 1
+                        segment = str(impact.segment)
+                        print(segment, i * 100 / len(segments), '%')
+                        write_file.write(segment + '\n')
+                        file_numpy = str(save_dir) + '/' + segment + '_grs%i.npy'%(grs)
+
 
                         if impact.lon_sun is None:   #JGB: This indicates no impacts at all in the chain.  There are 420 such examples, verified in a few examples.
                                 print( "NONE")
@@ -92,38 +108,16 @@ def redefine(dataDir = '/data', saveDir = '/FLUX_IMPACTS_ALL',usePtot=True):
                                 flux_OCC = [None]
                                 flux_Uniform = [None]
                         else:
-                                try:
-                                        lons = np.asarray(impact.lon_sun)
-                                        lats = np.asarray(impact.lat_sun)
-                                        Ptots = np.asarray(impact.Ptot)
-                                        if usePtot:
-                                                flux_JFC = populations[0].getFlux(lons, lats, Ptots, norm = False)
-                                                flux_HTC = populations[1].getFlux(lons, lats, Ptots,  norm = False)
-                                                flux_AST = populations[2].getFlux(lons, lats, Ptots, norm = False)
-                                                flux_OCC = populations[3].getFlux(lons, lats, Ptots,  norm = False)
-                                                # This number is meaningless with no norm but we dont have it for simplification reading in 
-                                                flux_Uniform = populations[4].getFlux(lons, lats, Ptots,  norm = False)
-                                        else:
-                                                flux_JFC = populations[0].getFlux(lons, lats, norm = False)
-                                                flux_HTC = populations[1].getFlux(lons, lats, norm = False)
-                                                flux_AST = populations[2].getFlux(lons, lats, norm = False)
-                                                flux_OCC = populations[3].getFlux(lons, lats, norm = False)
-                                                # This number is meaningless with no norm but we dont have it for simplification reading in 
-                                                flux_Uniform = populations[4].getFlux(lons, lats, norm = False)
-
-                                #except:
-                                except Exception as e:
-                                        print("Something went wrong: ",str(e))
-                                        print("Trying again")
-                                        fluxes = np.zeros((len(lons), len(populations)))
-                                        for i, population in enumerate(populations):
-                                                for j in range(len(lons)):
-                                                        fluxes[j, i] = populations[i].getFlux(lons[j], lats[j], Ptots[j], norm = False)
-                                        flux_JFC = fluxes[:, 0]
-                                        flux_HTC = fluxes[:, 1]
-                                        flux_AST = fluxes[:, 2]
-                                        flux_OCC = fluxes[:, 3]
-                                        flux_Uniform = fluxes[:, 4]
+                                lons = np.asarray(impact.lon_sun)
+                                lats = np.asarray(impact.lat_sun)
+                                Ptots = np.asarray(impact.Ptot)
+                                # Fluxes of all populations in one lookup, rows in the order of populations
+                                # Uniform is meaningless with no norm but we dont have it for simplification reading in 
+                                if usePtot:
+                                        fluxes = popSet.getFlux(lons, lats, Ptots, norm = False)
+                                else:
+                                        fluxes = popSet.getFlux(lons, lats, norm = False)
+                                flux_JFC, flux_HTC, flux_AST, flux_OCC, flux_Uniform = fluxes
 
                         
                         print(impact.segment,lons[0:3],lats[0:3],flux_JFC[0:3],flux_HTC[0:3],flux_Uniform[0:3])
@@ -177,13 +171,18 @@ class simpleImpact:
                 #print('flux[:,1000:1003]=',self.flux[:,1000:1003])
                 return
 
+def getSegmentIndex():
+        # impact_list.txt and segment_list.txt, read once and shared
+        from segmentIndex import getSegmentIndex
+        return getSegmentIndex(BASE_DIR + dataDir)
+
 def getVetoList():
-        df_veto = pd.read_csv(BASE_DIR + dataDir + '/impact_list.txt', header = 'infer',
-                        delim_whitespace = True)
-        return df_veto
+        return getSegmentIndex().df_veto
 
 
-def getisGlitch(segment, df_veto):
+def getisGlitch(segment, df_veto = None):
+        if df_veto is None:
+                return getSegmentIndex().isGlitch(segment)
         try:
                 index = df_veto.index[df_veto['segment'] == int(segment)][0]
         except IndexError:
@@ -193,20 +192,15 @@ def getisGlitch(segment, df_veto):
                 return df_veto['isGlitch'].values[index]
 
 def getisValidSearch(segment):
-        search_times = pd.read_csv(BASE_DIR + dataDir + '/segment_list.txt',
-                        header = None, names = ['segment'], delim_whitespace = True)
-
         # Jakes list does not cover all time, keep segments only within list
-        if segment > max(search_times['segment'].values):
-                return True
-        elif int(segment) in search_times['segment'].values:
-                return True
-        else:
-                return False
+        return getSegmentIndex().isValidSearch(segment)
 
-def isValid(segment, df_veto):
+def isValid(segment, df_veto = None):
         #       Both checks if the time searched is valid as well as 
         #       if the time is a glitch
+        #       segment can be an array of segments, then returns an array
+        if df_veto is None:
+                return getSegmentIndex().isValid(segment)
 
         if getisValidSearch(segment) and not getisGlitch(segment, df_veto):
                 return True
@@ -470,10 +464,11 @@ def getSegments(run_only_impacts = True, dataPath = BASE_DIR + dataDir,usePtot=T
                         filenames = files
                 all_segments = getGRSSegments(filenames)
 
-                for seg in all_segments:
-                        # Checks if impact is out of range and if the time 
-                        # Contains an impact glitch
-                        if isValid(seg, df_veto):
+                # Checks if impact is out of range and if the time 
+                # Contains an impact glitch, for all segments at once
+                valid = isValid(np.array(all_segments, dtype = int))
+                for seg, ok in zip(all_segments, valid):
+                        if ok:
                                 segments.append(simpleImpact(seg,usePtot=usePtot))
                         else:
                                 continue
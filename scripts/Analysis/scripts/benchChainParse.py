@@ -0,0 +1,106 @@
+# benchChainParse.py - benchmark of the chain file parsers in chainTools
+"""
+Writes synthetic impactchain.dat files (13 columns in the %lg format of the MCMC tool)
+and times every parser in chainTools.PARSERS against a plain np.loadtxt of the file.
+Every parser is checked to return the same array as np.loadtxt.
+
+usage: python benchChainParse.py [-n 1000000 10000000] [-b 0.5] [-d /tmp]
+"""
+
+import os
+import time
+import tempfile
+from argparse import ArgumentParser
+
+import numpy as np
+
+import chainTools
+
+
+def writeChain(fileName, N, seed = 0, chunk = 100000):
+	"""
+	Writes a synthetic impactchain.dat with N lines
+	"""
+	rng = np.random.RandomState(seed)
+	tmpName = fileName + '.part'
+	fmt = ' '.join(['%g'] * 2 + ['%i'] + ['%g'] * 6 + ['%i'] + ['%g'] * 3) + ' '
+	with open(tmpName, 'w') as fid:
+		for start in range(0, N, chunk):
+			n = min(chunk, N - start)
+			dat = np.column_stack((
+				rng.normal(10, 3, n),				# logL
+				rng.uniform(0, 50, n),				# snr
+				rng.randint(0, 2, n),				# N
+				rng.uniform(100, 1500, n),			# t0
+				10**rng.uniform(-8, -4, n),			# Ptot
+				rng.normal(size = (n, 2)),			# map
+				rng.uniform(-1, 1, n),				# costheta
+				rng.uniform(0, 2 * np.pi, n),		# phi
+				rng.randint(0, 10, n),				# face
+				rng.uniform(-1, 1, (n, 3)),			# r
+				))
+			np.savetxt(fid, dat, fmt = fmt)
+	os.rename(tmpName, fileName)
+
+
+def timeIt(func, repeat):
+	""" best wall time of repeat calls """
+	best = np.inf
+	for i in range(repeat):
+		t0 = time.time()
+		out = func()
+		best = min(best, time.time() - t0)
+	return best, out
+
+
+def bench(N, burnIn = 0.5, dataDir = None, repeat = 1, keep = False):
+	"""
+	Times the parsers on a synthetic chain of N lines
+	"""
+	fileName = os.path.join(dataDir or tempfile.gettempdir(), 'benchChain_%i.dat' % N)
+	if not os.path.exists(fileName):
+		print('writing ' + fileName)
+		writeChain(fileName, N)
+	size = os.path.getsize(fileName) / 1e6
+
+	print('\n%i lines, %.0f MB, burn in %.2f' % (N, size, burnIn))
+
+	# reference: everything through np.loadtxt, then trimmed
+	def reference():
+		dat = np.loadtxt(fileName, ndmin = 2)
+		return dat[int(len(dat) * burnIn):]
+	tRef, ref = timeIt(reference, repeat)
+	print('%-28s %8.2f s %8.1f MB/s' % ('np.loadtxt (full file)', tRef, size / tRef))
+
+	for parser in chainTools.PARSERS:
+		if parser == 'pandas':
+			try:
+				import pandas
+			except ImportError:
+				print('%-28s skipped, pandas not installed' % 'readChain/pandas')
+				continue
+		t, dat = timeIt(lambda: chainTools.readChain(fileName, burnIn = burnIn, parser = parser), repeat)
+		same = dat.shape == ref.shape and np.array_equal(dat, ref)
+		print('%-28s %8.2f s %8.1f MB/s  x%5.1f  %s' % ('readChain/' + parser, t, size / t,
+			tRef / t, 'identical' if same else 'MISMATCH'))
+
+	if not keep:
+		os.remove(fileName)
+
+
+if __name__ == '__main__':
+	parser = ArgumentParser(description = 'benchmark of the chain file parsers')
+	parser.add_argument('-n', '--lines', type = int, nargs = '+', default = [1000000, 10000000],
+		help = 'lengths of the synthetic chains')
+	parser.add_argument('-b', '--burnIn', type = float, default = 0.5,
+		help = 'burn in fraction')
+	parser.add_argument('-d', '--dir', default = None,
+		help = 'directory for the synthetic chains (default: system temp)')
+	parser.add_argument('-r', '--repeat', type = int, default = 1,
+		help = 'number of timings per parser, the best is kept')
+	parser.add_argument('-k', '--keep', action = 'store_true',
+		help = 'keep the synthetic chains for the next run')
+	args = parser.parse_args()
+
+	for N in args.lines:
+		bench(N, burnIn = args.burnIn, dataDir = args.dir, repeat = args.repeat, keep = args.keep)
@@ -0,0 +1,542 @@
+# chainStore.py - columnar, memory mapped store of the processed chains
+"""
+chainStore is a python module that holds the processed chains of a whole catalog in one
+directory instead of one pickle per segment and GRS.
+
+Every chain parameter (logL, snr, t0, Ptot, lat, lon, rx, ry, rz, face) is one contiguous
+binary array across all segments, and an offsets table gives the samples of each segment:
+the chain of segment i is column[offsets[i]:offsets[i+1]]. The per segment scalars
+(segment, gps, N, dfrac, run) are arrays with one entry per segment. The arrays are
+opened with np.memmap on first use, so opening a catalog only reads meta.json and the
+segment table, and only the pages of the columns that are touched are read from disk.
+
+Layout of a store directory
+	meta.json       version, grs, number of segments and samples, encoding of every column
+	offsets.bin     int64 [nSegments + 1]
+	<name>.bin      one raw array per column
+	<name>.idx      int64 byte offsets of the blocks of a compressed column
+
+The values are stored as in the pickles written by makePickleDir.py (Ptot in Ns, lat/lon
+in degrees), so getData returns the same dictionary as pickle.load of a pickle file.
+
+By default every chain column is stored as float64. A writer can instead store a column
+with a smaller dtype (e.g. float32 angles, int8 face), quantize it to integer multiples
+of a step (logL, snr), and compress it in blocks of samples with zlib (or zstd if the
+zstandard package is installed). Every lossy column has an error budget (atol, rtol);
+the writer decodes what it wrote and refuses values that do not meet it. See
+REDUCED_DTYPES, REDUCED_QUANTIZE and ERROR_BUDGET for the reduced precision settings.
+Compressed columns can not be memory mapped, only the blocks that are needed are read
+and decompressed.
+
+writeSunColumns adds the sun-centered angles of every sample (lat_sun, lon_sun, see
+impactClass.SCtoSun) to an existing store as two more float64 chain columns, computed for
+the whole catalog in one pass. getData does not return them, as they are not in the pickles.
+"""
+
+import glob
+import json
+import os
+import pickle
+import shutil
+import zlib
+
+import numpy as np
+
+STORE_VERSION = 2
+
+# store versions this module can read
+READ_VERSIONS = [1, 2]
+
+# chain parameters, one value per sample
+CHAIN_COLUMNS = ['logL', 'snr', 't0', 'Ptot', 'lat', 'lon', 'rx', 'ry', 'rz', 'face']
+
+# sun-centered angles written into a store by writeSunColumns
+SUN_COLUMNS = ['lat_sun', 'lon_sun']
+
+# per segment scalars, one value per segment
+SEGMENT_COLUMNS = ['segment', 'gps', 'N', 'dfrac', 'run']
+
+DTYPES = {
+	'logL' : 'float64', 'snr' : 'float64', 't0' : 'float64', 'Ptot' : 'float64',
+	'lat' : 'float64', 'lon' : 'float64', 'rx' : 'float64', 'ry' : 'float64',
+	'rz' : 'float64', 'face' : 'float64',
+	'segment' : 'float64', 'gps' : 'float64', 'N' : 'int64', 'dfrac' : 'float64',
+	'run' : 'S1',
+	}
+
+# reduced precision dtypes of the chain columns (face only takes the values 0-9)
+REDUCED_DTYPES = {
+	't0' : 'float32', 'Ptot' : 'float32', 'lat' : 'float32', 'lon' : 'float32',
+	'rx' : 'float32', 'ry' : 'float32', 'rz' : 'float32', 'face' : 'int8',
+	}
+
+# quantization steps, the column is stored as int32 multiples of the step
+REDUCED_QUANTIZE = {'logL' : 1e-3, 'snr' : 1e-3}
+
+
+def quantizeBudget(step):
+	"""
+	Returns the error budget (atol, rtol) of a column quantized with step: half a step,
+	with room for the round-off of values that sit exactly on a half step (the chains are
+	written with %lg, so values like 57.2755 are common)
+	"""
+	return (0.5 * step * (1 + 1e-9), 1e-12)
+
+
+# largest error allowed on a stored value x: atol + rtol * |x|
+ERROR_BUDGET = {
+	'logL' : quantizeBudget(REDUCED_QUANTIZE['logL']), 'snr' : quantizeBudget(REDUCED_QUANTIZE['snr']),
+	't0' : (1e-3, 1e-6), 'Ptot' : (0, 1e-6),
+	'lat' : (1e-4, 0), 'lon' : (1e-4, 0),
+	'rx' : (1e-6, 0), 'ry' : (1e-6, 0), 'rz' : (1e-6, 0),
+	'face' : (0, 0),
+	}
+
+# compressors for the blocks of a column
+COMPRESSORS = ['zlib', 'zstd']
+
+# number of samples per compressed block
+BLOCK_SIZE = 1 << 16
+
+
+def compressBlock(buf, compress, level = None):
+	""" Compresses the bytes of one block """
+	if compress == 'zlib':
+		return zlib.compress(buf, 6 if level is None else level)
+	elif compress == 'zstd':
+		import zstandard
+		return zstandard.ZstdCompressor(level = 3 if level is None else level).compress(buf)
+	raise ValueError('unknown compressor ' + str(compress) + ', use one of ' + str(COMPRESSORS))
+
+
+def decompressBlock(buf, compress):
+	""" Decompresses the bytes of one block """
+	if compress == 'zlib':
+		return zlib.decompress(buf)
+	elif compress == 'zstd':
+		import zstandard
+		return zstandard.ZstdDecompressor().decompress(buf)
+	raise ValueError('unknown compressor ' + str(compress) + ', use one of ' + str(COMPRESSORS))
+
+
+def encodeColumn(values, dtype, scale = None):
+	""" Converts the values of a column to their stored dtype (and quantization step) """
+	values = np.asarray(values, dtype = 'float64')
+	if scale is not None:
+		values = np.round(values / scale)
+	elif np.dtype(dtype).kind in 'iu':
+		values = np.round(values)
+	return values.astype(dtype)
+
+
+def decodeColumn(stored, scale = None):
+	""" Converts stored values back to the values of the column """
+	if scale is not None:
+		return stored * scale
+	return stored
+
+
+class storeWriter:
+	"""
+	Writes a chain store one segment at a time. Nothing but the last partial block of the
+	compressed columns is kept in memory between segments; the columns are appended to
+	their files and meta.json is written by close(). The store is built in storeDir.tmp
+	and moved in place once complete, so readers never see a half written store.
+	"""
+
+	def __init__(self, storeDir, grs = 1, dtypes = None, quantize = None, compress = None,
+			errorBudget = None, blockSize = BLOCK_SIZE, level = None):
+		"""
+			storeDir = directory of the store, replaced if it exists
+			grs = GRS of the chains in the store
+			dtypes = dictionary of stored dtypes of chain columns that are not float64,
+				e.g. REDUCED_DTYPES
+			quantize = dictionary of quantization steps of chain columns, stored as int32,
+				e.g. REDUCED_QUANTIZE
+			compress = compressor of the chain columns (one of COMPRESSORS), None to
+				store them raw
+			errorBudget = dictionary of (atol, rtol) overriding ERROR_BUDGET (quantized
+				columns default to quantizeBudget of their step)
+			blockSize = number of samples per compressed block
+			level = compression level, default of the compressor if None
+		"""
+		self.storeDir = storeDir
+		self.tmpDir = storeDir + '.tmp'
+		self.grs = grs
+		self.compress = compress
+		self.blockSize = int(blockSize)
+		self.level = level
+		if compress is not None:
+			# fail now rather than after the first block
+			compressBlock(b'', compress, level)
+
+		self.budget = dict(ERROR_BUDGET)
+		for name, step in (quantize or {}).items():
+			self.budget[name] = quantizeBudget(float(step))
+		self.budget.update(errorBudget or {})
+
+		# encoding of every column
+		self.encoding = {}
+		for name in CHAIN_COLUMNS + SEGMENT_COLUMNS:
+			self.encoding[name] = {'dtype' : DTYPES[name], 'scale' : None}
+		for name, dtype in (dtypes or {}).items():
+			self.encoding[name]['dtype'] = dtype
+		for name, step in (quantize or {}).items():
+			self.encoding[name] = {'dtype' : 'int32', 'scale' : float(step)}
+
+		if os.path.exists(self.tmpDir):
+			shutil.rmtree(self.tmpDir)
+		os.makedirs(self.tmpDir)
+
+		self.files = {}
+		for name in CHAIN_COLUMNS + SEGMENT_COLUMNS:
+			self.files[name] = open(os.path.join(self.tmpDir, name + '.bin'), 'wb')
+
+		# compressed columns: samples not yet written, byte offsets of the blocks
+		self.pending = dict((name, []) for name in CHAIN_COLUMNS)
+		self.blocks = dict((name, [0]) for name in CHAIN_COLUMNS)
+
+		# largest error of every lossy column
+		self.maxError = dict((name, 0.0) for name in CHAIN_COLUMNS)
+
+		self.offsets = [0]
+		self.segments = []
+
+	def isLossy(self, name):
+		""" True if the stored values of a column may differ from the given ones """
+		enc = self.encoding[name]
+		return enc['scale'] is not None or enc['dtype'] != DTYPES[name]
+
+	def encode(self, name, values):
+		"""
+		Returns the stored values of a chain column, after checking that they meet the
+		error budget of the column
+		"""
+		enc = self.encoding[name]
+		values = np.asarray(values, dtype = 'float64')
+		stored = encodeColumn(values, enc['dtype'], enc['scale'])
+		if self.isLossy(name):
+			decoded = decodeColumn(stored, enc['scale'])
+			err = np.abs(decoded - values)
+			atol, rtol = self.budget[name]
+			bad = ~(err <= atol + rtol * np.abs(values)) & ~(np.isnan(values) & np.isnan(decoded))
+			if np.any(bad):
+				i = np.flatnonzero(bad)[0]
+				raise ValueError('%s = %r stored as %s is off by %g, beyond its error budget (atol %g, rtol %g)'
+						% (name, values[i], enc['dtype'], err[i], atol, rtol))
+			if len(err) > 0:
+				self.maxError[name] = max(self.maxError[name], float(np.max(err)))
+		return stored
+
+	def writeBlocks(self, name, final = False):
+		""" Compresses and writes the full blocks pending for a column (all if final) """
+		pending = self.pending[name]
+		if len(pending) == 0:
+			return
+		buf = np.concatenate(pending)
+		nFull = len(buf) // self.blockSize * self.blockSize
+		stop = len(buf) if final else nFull
+		for start in range(0, stop, self.blockSize):
+			block = compressBlock(buf[start:start + self.blockSize].tobytes(), self.compress, self.level)
+			self.files[name].write(block)
+			self.blocks[name].append(self.blocks[name][-1] + len(block))
+		self.pending[name] = [] if stop == len(buf) else [buf[stop:]]
+
+	def append(self, data):
+		"""
+		Appends one segment.
+			data = dictionary as written by makePickleDir.readRawChain. Segments without
+				samples have None for the chain parameters (and gps)
+		"""
+		n = 0 if data['logL'] is None else len(data['logL'])
+		for name in CHAIN_COLUMNS:
+			if n == 0:
+				continue
+			if len(data[name]) != n:
+				raise ValueError('column %s of segment %s has %i samples, expected %i'
+						% (name, data['segment'], len(data[name]), n))
+			stored = self.encode(name, data[name])
+			if self.compress is None:
+				self.files[name].write(stored.tobytes())
+			else:
+				self.pending[name].append(stored)
+				self.writeBlocks(name)
+
+		gps = data['gps'] if data['gps'] is not None else np.nan
+		run = data.get('run', '') or ''
+		scalars = {'segment' : data['segment'], 'gps' : gps, 'N' : data['N'],
+				'dfrac' : data['dfrac'], 'run' : run.encode('ascii')}
+		for name in SEGMENT_COLUMNS:
+			self.files[name].write(np.array([scalars[name]], dtype = DTYPES[name]).tobytes())
+
+		self.offsets.append(self.offsets[-1] + n)
+		self.segments.append(data['segment'])
+
+	def close(self):
+		""" Writes the offsets and meta.json and moves the store in place """
+		if self.compress is not None:
+			for name in CHAIN_COLUMNS:
+				self.writeBlocks(name, final = True)
+				np.array(self.blocks[name], dtype = 'int64').tofile(
+						os.path.join(self.tmpDir, name + '.idx'))
+		for fid in self.files.values():
+			fid.close()
+		np.array(self.offsets, dtype = 'int64').tofile(os.path.join(self.tmpDir, 'offsets.bin'))
+
+		nSegments = len(self.segments)
+		nSamples = self.offsets[-1]
+		columns = {}
+		for name in CHAIN_COLUMNS:
+			columns[name] = {'dtype' : self.encoding[name]['dtype'], 'length' : nSamples,
+					'scale' : self.encoding[name]['scale'], 'compress' : self.compress,
+					'blockSize' : self.blockSize if self.compress is not None else None}
+			if self.isLossy(name):
+				columns[name]['budget'] = list(self.budget[name])
+				columns[name]['maxError'] = self.maxError[name]
+		for name in SEGMENT_COLUMNS:
+			columns[name] = {'dtype' : DTYPES[name], 'length' : nSegments}
+
+		meta = {'version' : STORE_VERSION, 'grs' : self.grs, 'nSegments' : nSegments,
+				'nSamples' : nSamples, 'columns' : columns}
+		with open(os.path.join(self.tmpDir, 'meta.json'), 'w') as fid:
+			json.dump(meta, fid, indent = 1, sort_keys = True)
+
+		if os.path.exists(self.storeDir):
+			shutil.rmtree(self.storeDir)
+		os.rename(self.tmpDir, self.storeDir)
+
+
+def buildStore(pickleDir, storeDir, grs = 1, reduced = False, compress = None):
+	"""
+	Converts a directory of <segment>_grs<grs>.pickle files into a chain store, sorted by
+	segment.
+	Arguments
+		pickleDir = directory with the pickles (ONLY_IMPACTS, ALL_IMPACTS, pyCatalog_*)
+		storeDir = directory of the store to write
+		grs = GRS of the pickles to convert
+		reduced = store the chains with REDUCED_DTYPES and REDUCED_QUANTIZE
+		compress = compressor of the chain columns (one of COMPRESSORS) or None
+	Returns the number of segments written
+	"""
+	pickles = glob.glob(os.path.join(pickleDir, '*_grs%i.pickle' % grs))
+	pickles.sort(key = lambda p: int(os.path.basename(p).split('_')[0]))
+
+	if reduced:
+		writer = storeWriter(storeDir, grs = grs, dtypes = REDUCED_DTYPES,
+				quantize = REDUCED_QUANTIZE, compress = compress)
+	else:
+		writer = storeWriter(storeDir, grs = grs, compress = compress)
+	for p in pickles:
+		with open(p, 'rb') as fid:
+			writer.append(pickle.load(fid))
+	writer.close()
+	return len(pickles)
+
+
+def writeSunColumns(store, quatFile, interpolate = False):
+	"""
+	Converts the lat and lon chains of every segment of a store to the sun-centered frame
+	and writes them into the store as the lat_sun and lon_sun columns (replaced if they
+	exist). The rotations of all segments are applied in one pass, see
+	frameTools.rotateSCtoSun.
+	Arguments
+		store = chainStore or the directory of one
+		quatFile = SC quaternion file (quats.npy)
+		interpolate = SLERP the SC attitude between samples instead of taking the nearest
+	Returns the chainStore, opened again
+	"""
+	import quaternion
+	from attitudeTools import getAttitude
+	from frameTools import ECI_to_MM, rotateSCtoSun
+
+	if not isinstance(store, chainStore):
+		store = chainStore(store)
+
+	lengths = np.diff(store.offsets)
+	full = np.flatnonzero(lengths > 0)
+	gps = store.column('gps')[full]
+	qr_ECI_SC = getAttitude(quatFile).getQuatArray(gps, interpolate = interpolate)
+	qr_ECI_MM = quaternion.as_float_array(ECI_to_MM(gps)).reshape(-1, 4)
+
+	index = np.repeat(np.arange(len(full)), lengths[full])
+	lat_sun, lon_sun = rotateSCtoSun(store.column('lat'), store.column('lon'),
+			qr_ECI_SC, qr_ECI_MM, index)
+
+	# each file is written aside and moved in place, meta.json last
+	meta = dict(store.meta)
+	meta['columns'] = dict(meta['columns'])
+	for name, values in zip(SUN_COLUMNS, [lat_sun, lon_sun]):
+		fileName = os.path.join(store.storeDir, name + '.bin')
+		values.astype('float64').tofile(fileName + '.tmp')
+		os.replace(fileName + '.tmp', fileName)
+		meta['columns'][name] = {'dtype' : 'float64', 'length' : store.nSamples,
+				'scale' : None, 'compress' : None, 'blockSize' : None,
+				'quatFile' : os.path.abspath(quatFile), 'interpolate' : bool(interpolate)}
+	metaFile = os.path.join(store.storeDir, 'meta.json')
+	with open(metaFile + '.tmp', 'w') as fid:
+		json.dump(meta, fid, indent = 1, sort_keys = True)
+	os.replace(metaFile + '.tmp', metaFile)
+
+	return chainStore(store.storeDir)
+
+
+class chainStore:
+	"""
+	Read access to a chain store. Raw columns are memory mapped on first use, compressed
+	columns are decompressed one block at a time.
+	"""
+
+	def __init__(self, storeDir):
+		"""
+			storeDir = directory of the store
+		"""
+		self.storeDir = storeDir
+		with open(os.path.join(storeDir, 'meta.json'), 'r') as fid:
+			self.meta = json.load(fid)
+		if self.meta['version'] not in READ_VERSIONS:
+			raise ValueError('chain store %s has version %s, this module reads versions %s'
+					% (storeDir, self.meta['version'], READ_VERSIONS))
+
+		self.grs = self.meta['grs']
+		self.nSegments = self.meta['nSegments']
+		self.nSamples = self.meta['nSamples']
+
+		self.columns = {}
+		self.blocks = {}
+		self.offsets = self.mapFile('offsets', 'int64', self.nSegments + 1)
+		self.segments = np.array(self.column('segment'))
+
+		# segment -> row in the segment table
+		self.rows = dict((int(s), i) for i, s in enumerate(self.segments))
+
+	def __len__(self):
+		return self.nSegments
+
+	def __contains__(self, segment):
+		return int(segment) in self.rows
+
+	def hasColumns(self, names):
+		""" True if the store holds all the columns in names """
+		return all(name in self.meta['columns'] for name in names)
+
+	def mapFile(self, name, dtype, length):
+		""" Memory maps <name>.bin """
+		if length == 0:
+			# empty files can not be mapped
+			return np.empty(0, dtype = dtype)
+		return np.memmap(os.path.join(self.storeDir, name + '.bin'), dtype = dtype,
+				mode = 'r', shape = (length,))
+
+	def encoding(self, name):
+		""" Returns the meta data of a column """
+		return self.meta['columns'][name]
+
+	def column(self, name):
+		"""
+		Returns a column over the whole store. Raw float columns are memory mapped,
+		compressed or quantized columns are decoded into memory once and kept.
+		"""
+		if name not in self.columns:
+			enc = self.encoding(name)
+			if enc.get('compress') is not None:
+				stored = self.readBlocks(name, 0, len(self.blockIndex(name)) - 1)
+			else:
+				stored = self.mapFile(name, enc['dtype'], enc['length'])
+			self.columns[name] = decodeColumn(stored, enc.get('scale'))
+		return self.columns[name]
+
+	def blockIndex(self, name):
+		""" Returns the byte offsets of the blocks of a compressed column """
+		if name not in self.blocks:
+			self.blocks[name] = np.fromfile(os.path.join(self.storeDir, name + '.idx'), dtype = 'int64')
+		return self.blocks[name]
+
+	def readBlocks(self, name, first, last):
+		""" Reads and decompresses the blocks first to last - 1 of a column """
+		enc = self.encoding(name)
+		index = self.blockIndex(name)
+		if last <= first:
+			return np.empty(0, dtype = enc['dtype'])
+		with open(os.path.join(self.storeDir, name + '.bin'), 'rb') as fid:
+			fid.seek(index[first])
+			buf = fid.read(index[last] - index[first])
+		parts = []
+		for i in range(first, last):
+			block = buf[index[i] - index[first]:index[i + 1] - index[first]]
+			parts.append(np.frombuffer(decompressBlock(block, enc['compress']), dtype = enc['dtype']))
+		return np.concatenate(parts)
+
+	def row(self, segment):
+		""" Returns the row of a segment in the segment table """
+		try:
+			return self.rows[int(segment)]
+		except KeyError:
+			raise KeyError('segment %s is not in the chain store %s' % (segment, self.storeDir))
+
+	def chainSlice(self, name, start, stop):
+		""" Returns the samples start to stop - 1 of a chain column """
+		if name in self.columns:
+			return self.columns[name][start:stop]
+		enc = self.encoding(name)
+		if enc.get('compress') is None:
+			return self.column(name)[start:stop]
+		if stop <= start:
+			return np.empty(0, dtype = enc['dtype'])
+
+		# only the blocks holding the samples are decompressed
+		size = enc['blockSize']
+		first = start // size
+		stored = self.readBlocks(name, first, (stop - 1) // size + 1)
+		stored = stored[start - first * size:stop - first * size]
+		return decodeColumn(stored, enc.get('scale'))
+
+	def getChain(self, segment, name):
+		""" Returns the chain of one parameter of a segment """
+		i = self.row(segment)
+		return self.chainSlice(name, self.offsets[i], self.offsets[i + 1])
+
+	def getScalar(self, segment, name):
+		""" Returns a per segment scalar of a segment """
+		value = self.column(name)[self.row(segment)]
+		if name == 'run':
+			return value.decode('ascii')
+		if name == 'gps':
+			return None if np.isnan(value) else float(value)
+		return value.item()
+
+	def getData(self, segment):
+		"""
+		Returns the dictionary of a segment, as pickle.load of its pickle file would.
+		The chains of raw float columns are views into the memory mapped columns.
+		"""
+		i = self.row(segment)
+		start, stop = self.offsets[i], self.offsets[i + 1]
+
+		data = {}
+		for name in SEGMENT_COLUMNS:
+			data[name] = self.getScalar(segment, name)
+		for name in CHAIN_COLUMNS:
+			data[name] = self.chainSlice(name, start, stop) if stop > start else None
+		return data
+
+
+if __name__ == '__main__':
+	from argparse import ArgumentParser
+	parser = ArgumentParser(description = 'converts a directory of pickles into a chain store')
+	parser.add_argument('pickleDir', help = 'directory with the <segment>_grs<n>.pickle files')
+	parser.add_argument('storeDir', help = 'directory of the store to write')
+	parser.add_argument('-g', '--grs', type = int, default = 1, help = 'GRS of the pickles')
+	parser.add_argument('--reduced', action = 'store_true',
+			help = 'store float32 angles and positions, int8 face and quantized logL/snr')
+	parser.add_argument('-c', '--compress', choices = COMPRESSORS, default = None,
+			help = 'compress the chain columns in blocks')
+	parser.add_argument('-s', '--sun', metavar = 'QUATFILE', default = None,
+			help = 'also write the sun-centered angles, using this SC quaternion file (quats.npy)')
+	args = parser.parse_args()
+
+	n = buildStore(args.pickleDir, args.storeDir, grs = args.grs, reduced = args.reduced,
+			compress = args.compress)
+	print('wrote %i segments to %s' % (n, args.storeDir))
+	if args.sun is not None:
+		writeSunColumns(args.storeDir, args.sun)
+		print('wrote %s to %s' % (', '.join(SUN_COLUMNS), args.storeDir))
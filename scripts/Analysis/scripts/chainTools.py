@@ -0,0 +1,455 @@
+# chainTools.py - a python module for reading MCMC chain files
+"""
+chainTools is a python module for reading the text chain files written by the MCMC tool
+(impactchain.dat, logLchain.dat). Every reader throws away the start of the chain for
+burn in, so the lines are first counted on the raw bytes, the file is positioned at the
+first sample that is kept and only the retained samples are parsed.
+
+The retained text is converted in large blocks by numpy's C tokenizer rather than line by
+line; see benchChainParse.py for a comparison of the available parsers.
+
+impactchain.dat was written with different column layouts over the runs. They are all
+declared in IMPACT_SCHEMAS, and readImpactChain returns a chain whose columns are looked
+up by name whatever the layout of the file.
+"""
+
+import bisect
+import io
+
+import numpy as np
+
+# size of the blocks read while counting lines [bytes]
+CHUNK_SIZE = 1 << 22
+
+# size of the blocks converted at a time by the 'fromstring' parser [bytes]
+PARSE_CHUNK_SIZE = 1 << 24
+
+# text parsers available to parseChain, PARSER is the default
+PARSERS = ['fromstring', 'pandas', 'loadtxt']
+PARSER = 'fromstring'
+
+
+def countLines(fid, chunkSize = CHUNK_SIZE):
+	"""
+	Counts the lines of an open binary chain file by counting newlines in large blocks,
+	without decoding or splitting the text.
+	Arguments
+		fid = open binary file object, must be seekable
+		chunkSize = size of the blocks read at a time [bytes]
+	Returns
+		nLines = number of lines (a last line without a newline is counted)
+		checkpoints = list of (byte offset, newlines before offset), one per block, used
+			by seekLine to find a line again without rescanning the file
+	"""
+	fid.seek(0)
+	checkpoints = [(0, 0)]
+	nLines = 0
+	offset = 0
+	last = b'\n'
+	while True:
+		block = fid.read(chunkSize)
+		if not block:
+			break
+		nLines += block.count(b'\n')
+		offset += len(block)
+		last = block[-1:]
+		checkpoints.append((offset, nLines))
+
+	if last != b'\n':
+		nLines += 1
+
+	return nLines, checkpoints
+
+
+def seekLine(fid, line, checkpoints):
+	"""
+	Positions an open binary chain file at the start of a line.
+	Arguments
+		fid = open binary file object
+		line = index of the line (starting at 0)
+		checkpoints = as returned by countLines for this file
+	"""
+	if line <= 0:
+		fid.seek(0)
+		return
+
+	# first block in which the line-th newline is found
+	counts = [c for o, c in checkpoints]
+	j = bisect.bisect_left(counts, line)
+	if j >= len(checkpoints):
+		fid.seek(checkpoints[-1][0])
+		return
+
+	start, before = checkpoints[j - 1]
+	fid.seek(start)
+	block = np.frombuffer(fid.read(checkpoints[j][0] - start), dtype = np.uint8)
+	newlines = np.flatnonzero(block == ord('\n'))
+	fid.seek(start + int(newlines[line - before - 1]) + 1)
+
+
+def parseChain(fid, usecols = None, nRows = None, parser = None, chunkSize = PARSE_CHUNK_SIZE, order = 'C'):
+	"""
+	Parses the rest of an open binary chain file into a 2D array [samples x columns].
+	Arguments
+		fid = open binary file object, positioned at the start of a line
+		usecols = columns to keep, default is all of them
+		nRows = number of lines left in the file; if known the output is allocated once
+		parser = one of PARSERS, default is PARSER
+			'fromstring' converts line aligned blocks of chunkSize bytes with numpy's C
+				tokenizer (np.fromstring) and reshapes them with the number of columns of
+				the first line
+			'pandas' uses the C parser of pandas.read_csv
+			'loadtxt' uses np.loadtxt
+		chunkSize = size of the blocks converted at a time by 'fromstring' [bytes]
+		order = memory layout of the output, 'F' keeps every column contiguous
+	"""
+	if parser is None:
+		parser = PARSER
+
+	if parser == 'fromstring':
+		return parseBlocks(fid, usecols = usecols, nRows = nRows, chunkSize = chunkSize, order = order)
+	elif parser == 'pandas':
+		import pandas as pd
+		df = pd.read_csv(fid, sep = r'\s+', header = None, engine = 'c', dtype = np.float64)
+		dat = df.values
+		if usecols is not None:
+			dat = dat[:, usecols]
+		return np.asarray(np.atleast_2d(dat), order = order)
+	elif parser == 'loadtxt':
+		return np.asarray(np.loadtxt(fid, usecols = usecols, ndmin = 2), order = order)
+	else:
+		raise ValueError('unknown chain parser ' + str(parser) + ', use one of ' + str(PARSERS))
+
+
+def parseBlocks(fid, usecols = None, nRows = None, chunkSize = PARSE_CHUNK_SIZE, order = 'C'):
+	"""
+	Bulk text to float conversion used by parseChain(parser = 'fromstring').
+	The file is read in blocks cut at the last newline, so no line is ever split between
+	two calls to np.fromstring, and every block is copied straight into the output.
+	"""
+	nCols = None
+	out = None
+	filled = 0
+	blocks = []
+	rest = b''
+	while True:
+		block = fid.read(chunkSize)
+		if block:
+			block = rest + block
+			cut = block.rfind(b'\n') + 1
+			if cut == 0:
+				rest = block
+				continue
+			block, rest = block[:cut], block[cut:]
+		elif rest.strip():
+			block, rest = rest, b''
+		else:
+			break
+
+		if nCols is None:
+			first = block.lstrip().split(b'\n', 1)[0]
+			nCols = len(first.split())
+			if nCols == 0:
+				continue
+
+		vals = np.fromstring(block.decode('ascii'), sep = ' ')
+		if vals.size % nCols != 0:
+			raise ValueError('chain file has lines with a different number of columns than the first (%i)' % nCols)
+		vals = vals.reshape(-1, nCols)
+		if usecols is not None:
+			vals = vals[:, usecols]
+
+		if out is None and nRows is not None:
+			out = np.empty((nRows, vals.shape[1]), order = order)
+		if out is not None and filled + len(vals) <= len(out):
+			out[filled:filled + len(vals)] = vals
+			filled += len(vals)
+		elif out is not None:
+			# more lines than announced, fall back to collecting the blocks
+			blocks = [out[:filled], vals]
+			out = None
+			nRows = None
+		else:
+			blocks.append(vals)
+
+	if out is not None:
+		return out[:filled]
+	if len(blocks) == 0:
+		return np.empty((0, 0))
+	if len(blocks) == 1:
+		return np.asarray(blocks[0], order = order)
+	return np.asarray(np.concatenate(blocks), order = order)
+
+
+def readChain(chainFile, burnIn = 0.5, lastN = None, usecols = None, getN = False, parser = None,
+		order = 'C'):
+	"""
+	Reads an MCMC chain file, parsing only the samples that are kept after burn in.
+	Arguments
+		chainFile = path to the chain file or an open binary file object
+		burnIn = fraction of the chain to throw out for burn in
+		lastN = if given, keep only the last lastN samples (after burn in)
+		usecols = columns to parse, default is all of them
+		getN = also return the number of samples in the full chain
+		parser = text parser, see parseChain
+		order = memory layout of dat, 'C' (samples contiguous) or 'F' (columns contiguous)
+	Returns
+		dat = array of the retained samples [samples x columns]
+		N_full = number of samples in the full chain (only if getN)
+	"""
+	if hasattr(chainFile, 'read'):
+		fid = chainFile
+		close = False
+	else:
+		fid = open(chainFile, 'rb')
+		close = True
+
+	try:
+		nLines, checkpoints = countLines(fid)
+
+		# first line kept
+		trim = int(float(nLines) * burnIn)
+		if lastN is not None:
+			trim = max(trim, nLines - int(lastN))
+
+		if trim >= nLines:
+			dat = np.empty((0, 0))
+		else:
+			seekLine(fid, trim, checkpoints)
+			dat = parseChain(fid, usecols = usecols, nRows = nLines - trim, parser = parser, order = order)
+	finally:
+		if close:
+			fid.close()
+
+	if getN:
+		return dat, nLines
+	return dat
+
+
+def tarMember(tar, member):
+	"""
+	Returns a chain file inside an open tarball as an in-memory binary file object. The
+	member is decompressed once, after which it can be read like a file on disk.
+	"""
+	fid = tar.extractfile(member)
+	try:
+		return io.BytesIO(fid.read())
+	finally:
+		fid.close()
+
+
+def readTarChain(tar, member, burnIn = 0.5, lastN = None, usecols = None, getN = False, parser = None):
+	"""
+	Reads a chain file straight out of an open tarball, as with readChain.
+	Arguments
+		tar = open tarfile
+		member = name of the chain file inside the tarball
+		other arguments as for readChain
+	"""
+	return readChain(tarMember(tar, member), burnIn = burnIn, lastN = lastN, usecols = usecols,
+			getN = getN, parser = parser)
+
+
+# ---------------------------------------#
+#        impactchain.dat layouts         #
+# ---------------------------------------#
+
+# Column layouts of impactchain.dat (see mcmc.c). The early runs were written before the
+# SNR column was added.
+IMPACT_SCHEMAS = {
+	'snr' : ['logL', 'snr', 'N', 't0', 'Ptot', 'map0', 'map1', 'costheta', 'phi', 'face',
+			'rx', 'ry', 'rz'],
+	'nosnr' : ['logL', 'N', 't0', 'Ptot', 'map0', 'map1', 'costheta', 'phi', 'face',
+			'rx', 'ry', 'rz'],
+	}
+
+# Layout written by each run letter, runs that are not listed use DEFAULT_SCHEMA
+RUN_SCHEMAS = {'e' : 'nosnr'}
+DEFAULT_SCHEMA = 'snr'
+
+
+def getSchema(run = None, nCols = None):
+	"""
+	Returns the name of the impactchain.dat layout of a chain.
+	Arguments
+		run = run letter that wrote the chain
+		nCols = number of columns found in the file (see sniffColumns); it decides when
+			given, the run letter is used for files without any sample
+	"""
+	if nCols:
+		for name in sorted(IMPACT_SCHEMAS):
+			if len(IMPACT_SCHEMAS[name]) == nCols:
+				return name
+		raise ValueError('no impactchain.dat layout has %i columns' % nCols)
+	return RUN_SCHEMAS.get(run, DEFAULT_SCHEMA)
+
+
+def sniffColumns(fid):
+	""" Returns the number of columns on the first line of an open binary chain file """
+	pos = fid.tell()
+	fid.seek(0)
+	line = fid.readline()
+	fid.seek(pos)
+	return len(line.split())
+
+
+class chainColumns:
+	"""
+	A parsed chain with named columns. The samples are held in one column-major array and
+	chain[name] is a view of one of its columns, so looking up a column copies nothing.
+	"""
+
+	def __init__(self, dat, names, N_full = None, schema = None):
+		"""
+			dat = array [samples x columns]
+			names = name of every column of dat
+			N_full = number of samples in the full chain, before burn in
+			schema = name of the layout of the file the chain was read from
+		"""
+		if dat.size == 0:
+			dat = np.empty((0, len(names)), order = 'F')
+		self.dat = dat
+		self.names = list(names)
+		self.index = dict((n, i) for i, n in enumerate(self.names))
+		self.N_full = N_full
+		self.schema = schema
+
+	def __getitem__(self, name):
+		return self.dat[:, self.index[name]]
+
+	def __contains__(self, name):
+		return name in self.index
+
+	def __len__(self):
+		return self.dat.shape[0]
+
+	def keys(self):
+		return list(self.names)
+
+	def toDataFrame(self, rename = None, index = None):
+		"""
+		Returns the chain as a pandas DataFrame.
+			rename = dictionary of column name -> DataFrame column name; if given, only
+				these columns are kept
+			index = index of the DataFrame
+		"""
+		import pandas as pd
+		if rename is None:
+			rename = dict((n, n) for n in self.names)
+		names = [n for n in self.names if n in rename]
+		return pd.DataFrame(self.dat[:, [self.index[n] for n in names]], index = index,
+				columns = [rename[n] for n in names])
+
+
+def readImpactChain(chainFile, run = None, burnIn = 0.5, lastN = None, columns = None, parser = None):
+	"""
+	Reads an impactchain.dat with named columns, whatever its layout. The layout is
+	sniffed from the number of columns on the first line (the run letter is only used for
+	empty files).
+	Arguments
+		chainFile = path to the chain file or an open binary file object
+		run = run letter that wrote the chain
+		columns = names of the columns to parse, default is all of them
+		other arguments as for readChain
+	Returns a chainColumns
+	"""
+	if hasattr(chainFile, 'read'):
+		fid = chainFile
+		close = False
+	else:
+		fid = open(chainFile, 'rb')
+		close = True
+
+	try:
+		schema = getSchema(run, sniffColumns(fid))
+		names = IMPACT_SCHEMAS[schema]
+		if columns is None:
+			usecols = None
+			columns = names
+		else:
+			usecols = [names.index(c) for c in columns]
+		dat, N_full = readChain(fid, burnIn = burnIn, lastN = lastN, usecols = usecols, getN = True,
+				parser = parser, order = 'F')
+	finally:
+		if close:
+			fid.close()
+
+	return chainColumns(dat, columns, N_full = N_full, schema = schema)
+
+
+# ---------------------------------------#
+#      linechain_channel<c>.dat          #
+# ---------------------------------------#
+
+def readLineChain(chainFile):
+	"""
+	Reads a linechain_channel<c>.dat written by BayesLine. Every row holds the number of
+	spectral lines n followed by n (frequency, amplitude, Q) triples, so the rows have
+	different lengths. The whole file is converted in one call to np.fromstring and the
+	rows are found from the token counts of every line, without a loop over the rows.
+	Arguments
+		chainFile = path to the line chain file
+	Returns
+		lines = array [lines x 3] of frequency, amplitude and Q of every line of every row
+		offsets = int array [rows + 1], the lines of row i are lines[offsets[i]:offsets[i+1]]
+	"""
+	with open(chainFile, 'rb') as fid:
+		buf = fid.read()
+
+	b = np.frombuffer(buf, dtype = np.uint8)
+	space = (b == ord(' ')) | (b == ord('\t')) | (b == ord('\n')) | (b == ord('\r'))
+
+	# first character of every token, and the row it is on
+	start = ~space
+	start[1:] &= space[:-1]
+	row = np.cumsum(b == ord('\n'))[start]
+
+	# tokens per row (blank lines have none)
+	counts = np.bincount(row)
+	counts = counts[counts > 0]
+	if len(counts) == 0:
+		return np.empty((0, 3)), np.zeros(1, dtype = int)
+
+	vals = np.fromstring(buf.decode('ascii'), sep = ' ')
+	if len(vals) != np.sum(counts):
+		raise ValueError('%s has %i numbers in %i tokens' % (chainFile, len(vals), np.sum(counts)))
+
+	# position of the n of every row
+	first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+	n = vals[first].astype(int)
+	if np.any(counts != 3 * n + 1):
+		i = np.flatnonzero(counts != 3 * n + 1)[0]
+		raise ValueError('row %i of %s has %i values for %i lines' % (i, chainFile, counts[i] - 1, n[i]))
+
+	keep = np.ones(len(vals), dtype = bool)
+	keep[first] = False
+	lines = vals[keep].reshape(-1, 3)
+	offsets = np.concatenate(([0], np.cumsum(n)))
+	return lines, offsets
+
+
+def readLineChains(chainFiles, nproc = None):
+	"""
+	Reads several line chain files (e.g. the 6 channels of a segment) in parallel worker
+	processes, as makePickleDir.buildCatalog (the parsing holds the GIL, so threads would
+	read them one after the other).
+	Arguments
+		chainFiles = list of paths
+		nproc = number of worker processes, default is one per file (at most one per core);
+			1 reads the files here, one after the other
+	Returns a list of (lines, offsets) as returned by readLineChain, in the order of
+	chainFiles
+	"""
+	import multiprocessing
+
+	if nproc is None:
+		nproc = min(len(chainFiles), multiprocessing.cpu_count())
+	if nproc <= 1 or len(chainFiles) < 2:
+		return [readLineChain(chainFile) for chainFile in chainFiles]
+
+	pool = multiprocessing.Pool(nproc)
+	try:
+		return pool.map(readLineChain, chainFiles)
+	finally:
+		pool.close()
+		pool.join()
@@ -0,0 +1,245 @@
+# frameTools.py - vectorized frame rotations between ECI, Sun and micrometeoroid frames
+"""
+frameTools is a python module for the rotations from the ECI (J2000) frame to the frames
+used by the micrometeoroid population models, evaluated for arrays of GPS times at once.
+
+The Sun direction comes from a precomputed ephemeris table: astropy's get_body('sun') is
+evaluated once on a regular time grid covering the mission, the table is saved to disk,
+and the direction at any time is interpolated from it. Repeated catalog passes therefore
+never call astropy per impact. Times outside the table are evaluated with astropy, in a
+single call for all of them.
+
+The MM frame rotation (ECI_to_MM) only depends on the position of the Earth in its orbit
+since the spring equinox and is computed in closed form for all times together.
+
+rotateSCtoSun converts the SC frame angles of the samples of a whole catalog to the
+sun-centered frame in one vectorized pass, given one rotation per impact and the impact of
+every sample.
+"""
+
+import os
+
+import numpy as np
+
+# name of the Sun ephemeris cache in the data directory
+EPHEMERIS_FILE = 'sunEphemeris.npz'
+
+# GPS span of the Sun ephemeris table (LISA Pathfinder mission, with margin) and its step
+EPHEMERIS_START = 1130000000
+EPHEMERIS_STOP = 1190000000
+EPHEMERIS_STEP = 3600
+
+# Seconds between the unix and GPS epochs (datetime, no leap seconds, as ECI_to_MM)
+GPS_FROM_UTC = 315964800.0
+
+# Earth's axial tilt used by ECI_to_MM
+AXIAL_TILT = 23.5 * np.pi / 180
+
+# cache file -> sunEphemeris
+_ephemerides = {}
+
+
+def astropySun(gps):
+	"""
+	Returns the unit vectors [n x 3] towards the Sun (ECI) at the GPS times, from astropy,
+	in one call for all times
+	"""
+	from astropy.time import Time
+	from astropy.coordinates import get_body
+
+	s = get_body('sun', Time(np.atleast_1d(gps), format = 'gps', scale = 'utc'))
+	dec = s.dec.value * np.pi / 180
+	ra = s.ra.value * np.pi / 180
+	return np.column_stack((np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)))
+
+
+class sunEphemeris:
+	"""
+	Table of Sun directions on a regular GPS grid, interpolated linearly between the grid
+	points and normalized (the error is below 1e-7 rad for a one hour step)
+	"""
+
+	def __init__(self, cacheFile = None, start = EPHEMERIS_START, stop = EPHEMERIS_STOP,
+			step = EPHEMERIS_STEP):
+		"""
+			cacheFile = .npz file the table is read from, or written to if it does not
+				exist yet (or does not match the grid); None to keep it in memory only
+			start, stop, step = GPS grid of the table [s]
+		"""
+		self.start = float(start)
+		self.step = float(step)
+		self.gps = np.arange(start, stop + step, step, dtype = float)
+		self.usun = None
+
+		if cacheFile is not None and os.path.isfile(cacheFile):
+			cache = np.load(cacheFile)
+			if np.array_equal(cache['gps'], self.gps):
+				self.usun = cache['usun']
+
+		if self.usun is None:
+			self.usun = astropySun(self.gps)
+			if cacheFile is not None:
+				try:
+					np.savez(cacheFile, gps = self.gps, usun = self.usun)
+				except (IOError, OSError):
+					print('could not write the Sun ephemeris cache ' + cacheFile)
+
+	def __call__(self, gps):
+		""" Returns the unit vectors [n x 3] towards the Sun at the GPS times """
+		gps = np.atleast_1d(np.asarray(gps, dtype = float))
+		x = (gps - self.start) / self.step
+		inside = (x >= 0) & (x <= len(self.gps) - 1)
+
+		usun = np.empty((len(gps), 3))
+		i = np.minimum(np.floor(x[inside]).astype(int), len(self.gps) - 2)
+		f = (x[inside] - i)[:, np.newaxis]
+		u = (1 - f) * self.usun[i] + f * self.usun[i + 1]
+		usun[inside] = u / np.sqrt(np.sum(u * u, axis = 1))[:, np.newaxis]
+
+		if not np.all(inside):
+			usun[~inside] = astropySun(gps[~inside])
+		return usun
+
+
+def getSunEphemeris(cacheFile = None):
+	""" Returns the Sun ephemeris of a cache file, built or read once per process """
+	key = None if cacheFile is None else os.path.abspath(cacheFile)
+	if key not in _ephemerides:
+		_ephemerides[key] = sunEphemeris(cacheFile)
+	return _ephemerides[key]
+
+
+def toQuats(q, scalar):
+	""" float array [n x 4] -> quaternion array, or a quaternion if scalar """
+	import quaternion
+
+	q = quaternion.as_quat_array(q)
+	if scalar:
+		return q[0]
+	return q
+
+
+def ECI_to_SUN(gps, cacheFile = None):
+	"""
+	Returns the rotation quaternions from ECI to SUN coordinates (place +x in the Sunward
+	direction) at the GPS times; a quaternion for a single time.
+		gps = GPS time or array of GPS times
+		cacheFile = Sun ephemeris cache, see sunEphemeris
+	"""
+	usun = getSunEphemeris(cacheFile)(gps)
+
+	# quaternion between x and the sunward direction: [1 + ux . usun, usun x ux]
+	q = np.column_stack((1 + usun[:, 0], np.zeros(len(usun)), usun[:, 2], -usun[:, 1]))
+	q /= np.sqrt(np.sum(q * q, axis = 1))[:, np.newaxis]
+	return toQuats(q, np.ndim(gps) == 0)
+
+
+def orbitPhase(gps):
+	""" Returns the angle of the Earth in its orbit since March 21st of the year [rad] """
+	gps = np.atleast_1d(np.asarray(gps, dtype = float))
+	date = ((gps + GPS_FROM_UTC) * 1e6).astype('int64').astype('datetime64[us]')
+	march21 = (date.astype('datetime64[Y]').astype('datetime64[M]') + 2).astype('datetime64[D]') + 20
+	secOfYear = (date - march21) / np.timedelta64(1, 's')
+	return (secOfYear / 3.154E7) * 2 * np.pi
+
+
+def matrixToQuats(R):
+	""" Converts rotation matrices [n x 3 x 3] into quaternions [n x 4] (w, x, y, z) """
+	q = np.empty((len(R), 4))
+	tr = R[:, 0, 0] + R[:, 1, 1] + R[:, 2, 2]
+
+	b0 = tr > 0.0
+	b1 = ~b0 & (R[:, 0, 0] > R[:, 1, 1]) & (R[:, 0, 0] > R[:, 2, 2])
+	b2 = ~b0 & ~b1 & (R[:, 1, 1] > R[:, 2, 2])
+	b3 = ~b0 & ~b1 & ~b2
+
+	r = R[b0]
+	S = np.sqrt(tr[b0] + 1.0) * 2
+	q[b0] = np.column_stack((0.25 * S, (r[:, 2, 1] - r[:, 1, 2]) / S,
+			(r[:, 0, 2] - r[:, 2, 0]) / S, (r[:, 1, 0] - r[:, 0, 1]) / S))
+	r = R[b1]
+	S = np.sqrt(1.0 + r[:, 0, 0] - r[:, 1, 1] - r[:, 2, 2]) * 2
+	q[b1] = np.column_stack(((r[:, 2, 1] - r[:, 1, 2]) / S, 0.25 * S,
+			(r[:, 0, 1] + r[:, 1, 0]) / S, (r[:, 0, 2] + r[:, 2, 0]) / S))
+	r = R[b2]
+	S = np.sqrt(1.0 + r[:, 1, 1] - r[:, 0, 0] - r[:, 2, 2]) * 2
+	q[b2] = np.column_stack(((r[:, 0, 2] - r[:, 2, 0]) / S, (r[:, 0, 1] + r[:, 1, 0]) / S,
+			0.25 * S, (r[:, 1, 2] + r[:, 2, 1]) / S))
+	r = R[b3]
+	S = np.sqrt(1.0 + r[:, 2, 2] - r[:, 0, 0] - r[:, 1, 1]) * 2
+	q[b3] = np.column_stack(((r[:, 1, 0] - r[:, 0, 1]) / S, (r[:, 0, 2] + r[:, 2, 0]) / S,
+			(r[:, 1, 2] + r[:, 2, 1]) / S, 0.25 * S))
+	return q
+
+
+def ECI_to_MM(gps):
+	"""
+	Returns the rotation quaternions from ECI to micrometeoroid coordinates at the GPS
+	times; a quaternion for a single time. Same rotation as impactClass.ECI_to_MM.
+
+	MM coords
+	sun = 0,0
+	apex direction (Earth's motion) = -90
+	anti-apex direction = +90
+	"""
+	phi = orbitPhase(gps)
+	theta = AXIAL_TILT
+
+	# Rotation matrix from ECI to MM
+	R = np.zeros((len(phi), 3, 3))
+	R[:, 0, 0] = np.cos(phi)
+	R[:, 0, 1] = np.sin(phi) * np.cos(theta)
+	R[:, 0, 2] = np.sin(theta) * np.sin(theta)
+	R[:, 1, 0] = -np.sin(phi)
+	R[:, 1, 1] = np.cos(phi) * np.cos(theta)
+	R[:, 1, 2] = np.cos(phi) * np.sin(theta)
+	R[:, 2, 1] = -np.sin(theta)
+	R[:, 2, 2] = np.cos(theta)
+
+	# conjugate of the quaternion of R
+	q = matrixToQuats(R)
+	q[:, 1:] *= -1
+	return toQuats(q, np.ndim(gps) == 0)
+
+
+# number of samples rotated at a time by rotateSCtoSun
+ROTATE_CHUNK_SIZE = 1 << 20
+
+
+def rotateSCtoSun(lat, lon, qr_ECI_SC, qr_ECI_MM, index):
+	"""
+	Converts angles from the SC frame to the sun-centered frame used by the micrometeoroid
+	population models for the samples of many impacts in one pass. Same rotations as
+	impactClass.SCtoSun: SC to ECI, then ECI to MM.
+	Arguments
+		lat, lon = concatenated SC latitudes and longitudes of the samples [deg]
+		qr_ECI_SC = float array [m x 4] (w, x, y, z), rotation from SC to ECI of every impact
+		qr_ECI_MM = float array [m x 4] (w, x, y, z), rotation from ECI to MM of every impact
+		index = int array, impact (row of the quaternion arrays) of every sample
+	Returns lat_sun, lon_sun [deg]
+	"""
+	import quaternion
+
+	if len(lat) == 0:
+		return np.empty(0), np.empty(0)
+
+	# one rotation matrix per impact for both rotations
+	q = quaternion.as_quat_array(qr_ECI_MM) * quaternion.as_quat_array(qr_ECI_SC)
+	R = quaternion.as_rotation_matrix(np.atleast_1d(q)).reshape(-1, 3, 3)
+
+	lat = np.asarray(lat, dtype = float)
+	lon = np.asarray(lon, dtype = float)
+	index = np.asarray(index)
+	lat_sun = np.empty(len(lat))
+	lon_sun = np.empty(len(lat))
+	for start in range(0, len(lat), ROTATE_CHUNK_SIZE):
+		s = slice(start, start + ROTATE_CHUNK_SIZE)
+		lat_rad = lat[s] * np.pi / 180
+		lon_rad = lon[s] * np.pi / 180
+		n = np.column_stack((np.cos(lat_rad) * np.cos(lon_rad),
+				np.cos(lat_rad) * np.sin(lon_rad), np.sin(lat_rad)))
+		n = np.einsum('kij,kj->ki', R[index[s]], n)
+
+		lon_sun[s] = 180 / np.pi * np.arctan2(n[:, 1], n[:, 0])
+		lat_sun[s] = 180 / np.pi * np.arctan2(n[:, 2], np.sqrt(np.square(n[:, 0]) + np.square(n[:, 1])))
+	return lat_sun, lon_sun
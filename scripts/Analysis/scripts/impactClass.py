@@ -47,10 +47,26 @@ from scipy.optimize import curve_fit
 
 
 class impactClass:
-	def __init__(self, chainFile = None, BASE_DIR = None, chainDir = None, GRS_num = 1, burnIn = 0.5, dataDir = '/data'): 
+	# chain columns that lazy instances read on first access, see __getattr__
+	LAZY_CHAINS = ['logL', 'snr', 't0', 'lat', 'lon', 'rx', 'ry', 'rz', 'face']
+
+	# summary statistics computed once per chain and kept next to it, see getSummary
+	SUMMARY_VERSION = 2
+	SUMMARY_PARAMS = ['snr', 't0', 'Ptot', 'lat', 'lon', 'rx', 'ry', 'rz']
+	SUMMARY_PERCENTILES = [2.5, 2.75, 5, 16, 50, 84, 95, 97.5]
+	SUMMARY_CREDIBLES = [0.5, 0.68, 0.9, 0.95, 0.99]
+	SUMMARY_SKY = ['lat_c', 'lon_c', 'skyArea', 'lat_c_sun', 'lon_c_sun', 'skyArea_sun']
+
+	def __init__(self, chainFile = None, BASE_DIR = None, chainDir = None, GRS_num = 1, burnIn = 0.5, dataDir = '/data',
+			store = None, lazy = False): 
 		"""
 			if ChainFile is specified, reads in from pickle data
 			if chainDir os specified, writes pickle data
+			if store is specified (a chainStore or the directory of one), chainFile is the
+				segment and its data is read from the store instead of a pickle
+			if lazy, nothing but the segment is read here; chains, veto flags and derived
+				quantities (Ptot in micro Ns, lat_sun/lon_sun, ...) are read or computed
+				the first time they are used and then kept
 		"""
 		if chainDir is not None:
 			print('ERROR, THIS FUNCTION IS UNTESTED')
@@ -78,30 +94,29 @@ class impactClass:
 			base = os.path.basename(chainDir)
 			gpsTime = float(base[len(base) - 10 : len(base)])
 			
-			# load impactChain
+			from chainTools import readChain, readImpactChain
+
+			# load impactChain, burn in is skipped without being parsed
 			impFile = chainDir +'/impactchain.dat'
-			dat = np.loadtxt(impFile)
-			N = np.shape(dat)[0]
-			trim = int(float(N) * burnIn);
-			dat = np.delete(dat, slice(0, trim), axis=0)
+			chain = readImpactChain(impFile, burnIn = burnIn)
 
 			
 			# build into a dictionary
-			t0 = np.median(dat[:, 3])
+			t0 = np.median(chain['t0'])
 
 			self.segment = gpsTime
 			self.gps     = gpsTime + 1638.4 - t0
-			self.N       = np.shape(dat)[0]
-			self.logL    = dat[:, 0]
-			self.snr     = dat[:, 1]
-			self.t0      = -(dat[:, 3] - t0)
-			self.Ptot    = dat[:, 4]
-			self.lat     = 90 - (np.arccos(dat[:,7]) * 180 / np.pi)
-			self.lon     = np.mod(dat[:, 8] * 180 / np.pi + 180, 360) - 180
-			self.rx      = dat[:, 10]
-			self.ry      = dat[:, 11]
-			self.rz      = dat[:, 12] 
-			self.face    = dat[:, 9]
+			self.N       = len(chain)
+			self.logL    = chain['logL']
+			self.snr     = chain['snr']
+			self.t0      = -(chain['t0'] - t0)
+			self.Ptot    = chain['Ptot']
+			self.lat     = 90 - (np.arccos(chain['costheta']) * 180 / np.pi)
+			self.lon     = np.mod(chain['phi'] * 180 / np.pi + 180, 360) - 180
+			self.rx      = chain['rx']
+			self.ry      = chain['ry']
+			self.rz      = chain['rz'] 
+			self.face    = chain['face']
 			self.grs     = GRS_num
 
 
@@ -122,16 +137,13 @@ class impactClass:
 				'face'    : self.face,  
 			}
 
-			df_veto = self.getVetoList()
-			self.isImpact = self.getisImpact(df_veto)
-			self.isGlitch = self.getisGlitch(df_veto)
+			self.isImpact = self.getisImpact()
+			self.isGlitch = self.getisGlitch()
 			self.isValidSearch = self.getisValidSearch()
 
 			# load log likelihood chain
 			logLfile = chainDir +'/logLchain.dat'
-			dat = np.loadtxt(logLfile)
-			trim = int(float(self.N) * burnIn);
-			dat = np.delete(dat, slice(0, trim), axis=0)
+			dat = readChain(logLfile, burnIn)
 			
 			# compute detection fraction
 			dfrac = np.sum(dat[:, 0]) / (np.shape(dat)[0])
@@ -154,9 +166,24 @@ class impactClass:
 				self.BASE_DIR = str(BASE_DIR)
 			self.dataDir = dataDir
 
-			fid = open(chainFile,'rb')
-			data = pickle.load(fid)
-			fid.close()
+			if store is not None:
+				from chainStore import chainStore
+				if not isinstance(store, chainStore):
+					store = chainStore(store)
+
+			self.grs = GRS_num
+			self._summaryFile, self._sourceFile = self.summaryFiles(chainFile, store)
+			if lazy:
+				self._lazy = True
+				self._chainFile = chainFile
+				self._store = store
+				if store is not None:
+					self.segment = store.getScalar(chainFile, 'segment')
+				else:
+					self.segment = float(os.path.basename(chainFile)[0:10])
+				return
+
+			data = self.readData(chainFile, store)
 			
 			# Loads dictionary into data
 			self.data = data
@@ -198,9 +225,8 @@ class impactClass:
 			else:
 				self.Ptot = None
 
-			df_veto = self.getVetoList()
-			self.isImpact = self.getisImpact(df_veto)
-			self.isGlitch = self.getisGlitch(df_veto)
+			self.isImpact = self.getisImpact()
+			self.isGlitch = self.getisGlitch()
 			self.isValidSearch = self.getisValidSearch()
 			self.define_coords()
 
@@ -211,6 +237,83 @@ class impactClass:
 	def __str__(self):
 		return str(self.__class__) + ": " + str(self.__dict__)
 
+	def readData(self, chainFile, store = None):
+		""" Returns the dictionary of the chain, from the pickle file or the chain store """
+		import pickle
+		if store is not None:
+			return store.getData(chainFile)
+		fid = open(chainFile,'rb')
+		data = pickle.load(fid)
+		fid.close()
+		return data
+
+	def __getattr__(self, name):
+		"""
+		Only called for attributes that are not set. Lazy instances read or compute them
+		here on first access and keep them as ordinary attributes.
+		"""
+		if name in ['healPix', 'healPix_sun'] and name.replace('healPix', 'skyMap') in self.__dict__:
+			return self.denseSkyMap(name == 'healPix_sun')
+		if name.startswith('__') or not self.__dict__.get('_lazy', False):
+			raise AttributeError(name)
+
+		store = self._store
+		if name == 'data':
+			value = self.readData(self._chainFile, store)
+		elif name in self.LAZY_CHAINS:
+			if store is not None:
+				value = store.getChain(self.segment, name)
+				if len(value) == 0:
+					value = None
+			else:
+				value = self.data[name]
+		elif name in ['N', 'dfrac', 'run']:
+			if store is not None:
+				value = store.getScalar(self.segment, name)
+			elif name in self.data:
+				value = self.data[name]
+			else:
+				raise AttributeError(name)
+		elif name == 'gps':
+			if store is not None:
+				value = store.getScalar(self.segment, 'gps')
+			else:
+				value = self.data['gps']
+			# Exceptions for when we have 0 impacts
+			if value is None:
+				value = self.segment
+		elif name == 'Ptot':
+			if store is not None:
+				value = store.getChain(self.segment, 'Ptot')
+				value = value * 10 ** 6 if len(value) > 0 else None # Micro Ns
+			else:
+				value = self.data['Ptot']
+				value = value * 10 ** 6 if value is not None else None # Micro Ns
+		elif name == 'N_1':
+			value = int(self.dfrac * self.N)
+		elif name == 'isEmpty':
+			value = self.lon is None or len(self.lon) == 0
+		elif name == 'isImpact':
+			value = self.getisImpact()
+		elif name == 'isGlitch':
+			value = self.getisGlitch()
+		elif name == 'isValidSearch':
+			value = self.getisValidSearch()
+		elif name in ['H', 'xsc', 'ysc']:
+			self.define_coords()
+			return self.__dict__[name]
+		elif name in ['lat_sun', 'lon_sun']:
+			if store is not None and store.hasColumns(['lat_sun', 'lon_sun']):
+				value = store.getChain(self.segment, name) if not self.isEmpty else None
+			else:
+				self.SCtoSun()
+				return self.__dict__[name]
+		else:
+			raise AttributeError(name)
+
+		self.__dict__[name] = value
+		return value
+
 	def filename(self):
 		""" Returns segment as a string """
 		return str(int(self.segment))
@@ -256,6 +359,7 @@ class impactClass:
 		""" 
 			Returns median of parameter if len(param) > 1,
 			else returns parameter
+			The medians of the chains come from the summary, see getSummary
 		"""
 		if (param == 'segment'):
 			return self.segment
@@ -263,22 +367,9 @@ class impactClass:
 			return self.gps
 		elif param == 'N':
 			return self.N
-		elif param == 'snr':
-			return np.median(self.snr)
-		elif param == 't0':
-			return np.median(self.t0)
-		elif param == 'Ptot':
-			return np.median(self.Ptot)
-		elif param == 'lat':
-			return np.median(self.lat)
-		elif param == 'lon':
-			return np.median(self.lon)
-		elif param == 'rx':
-			return np.median(self.rx)
-		elif param == 'ry':
-			return np.median(self.ry)
-		elif param == 'rz':
-			return np.median(self.rz)
+		elif param in self.SUMMARY_PARAMS:
+			summary = self.getSummary()
+			return None if summary['isEmpty'] else summary['median'][param]
 		elif param == 'face':
 			return stats.mode(self.face)
 		elif param == 'grs':
@@ -292,13 +383,164 @@ class impactClass:
 		else: 
 			print("Invaid Input: given,", param)
 
+	def summaryFiles(self, chainFile, store = None):
+		"""
+		Returns the file the summary of the chain is kept in and the file it is computed
+		from (the summary is computed again if that file changed), None if not known
+		"""
+		if store is not None:
+			summaryFile = os.path.join(store.storeDir, 'summaries', '%i_grs%i.json'%(int(chainFile), self.grs))
+			return summaryFile, os.path.join(store.storeDir, 'meta.json')
+		if chainFile is None:
+			return None, None
+		return os.path.splitext(str(chainFile))[0] + '.summary.json', str(chainFile)
+
+	def computeSummary(self):
+		"""
+		Computes the summary statistics of the chain parameters (medians, means, standard
+		deviations, percentiles and credible intervals of SUMMARY_PARAMS, face histogram).
+		Returns a dictionary that can be written as JSON. The sky statistics are computed
+		separately, see computeSkySummary.
+		"""
+		summary = {'version' : self.SUMMARY_VERSION, 'isEmpty' : bool(self.isEmpty),
+				'percentiles' : self.SUMMARY_PERCENTILES, 'credibles' : self.SUMMARY_CREDIBLES}
+		if self.isEmpty:
+			return summary
+
+		for key in ['median', 'mean', 'std', 'percentile', 'credible']:
+			summary[key] = {}
+		for param in self.SUMMARY_PARAMS:
+			data = np.asarray(self.getParam(param), dtype = float)
+			summary['median'][param] = float(np.median(data))
+			summary['mean'][param] = float(np.mean(data))
+			summary['std'][param] = float(np.std(data))
+			summary['percentile'][param] = np.percentile(data, self.SUMMARY_PERCENTILES).tolist()
+
+			# order statistics as taken by impactClassList.credible_interval
+			data = np.sort(data, axis = None)
+			N = len(data)
+			cred = [float(data[int(N / 2.0)])]
+			for credible in self.SUMMARY_CREDIBLES:
+				conup   = (credible + ((1 - credible) / 2.0)) 
+				condown =((1 - credible) / 2.0)      
+				cred.append([float(data[int(N * conup)]), float(data[int(N * condown)])])
+			summary['credible'][param] = cred
+
+		cf, bf = np.histogram(self.face, bins=np.arange(0.5, 11, 1),density = True)
+		summary['faceHist'] = cf.tolist()
+		return summary
+
+	def sunAngles(self):
+		"""
+		Returns lat_sun, lon_sun of the chain, as SCtoSun, without setting them on the
+		impact: the angles already set, the columns of the chain store, or a rotation
+		"""
+		import quaternion
+		from frameTools import rotateSCtoSun
+
+		if 'lat_sun' in self.__dict__:
+			return self.lat_sun, self.lon_sun
+		store = self.__dict__.get('_store')
+		if store is not None and store.hasColumns(['lat_sun', 'lon_sun']):
+			return store.getChain(self.segment, 'lat_sun'), store.getChain(self.segment, 'lon_sun')
+
+		qr_ECI_SC = quaternion.as_float_array(self.getSCquats())
+		qr_ECI_MM = quaternion.as_float_array(self.ECI_to_MM())
+		return rotateSCtoSun(self.lat, self.lon, qr_ECI_SC[np.newaxis], qr_ECI_MM[np.newaxis],
+				np.zeros(len(self.lat), dtype = int))
+
+	def computeSkySummary(self, CI = 0.68, nside = 32):
+		"""
+		Computes the sky centroid and area of the chain in the SC and Sun frames, as
+		findSkyAngles with its defaults, without setting anything on the impact.
+		Returns a dictionary with the keys of SUMMARY_SKY.
+		"""
+		from skyTools import skyLocalizer
+
+		lat_sun, lon_sun = self.sunAngles()
+		sky = {}
+		for suffix, lat, lon in [('', self.lat, self.lon), ('_sun', lat_sun, lon_sun)]:
+			lat_c, lon_c, area = skyLocalizer(lon, lat).locate(self.N_1, CI, nside)
+			sky['lat_c' + suffix] = float(lat_c[0])
+			sky['lon_c' + suffix] = float(lon_c[0])
+			sky['skyArea' + suffix] = float(area[0])
+		return sky
+
+	def getSummary(self, sky = False):
+		"""
+		Returns the summary statistics of the chain (see computeSummary). They are
+		computed once and written next to the chain (<segment>_grs<n>.summary.json, or in
+		the summaries directory of a chain store), and read from there as long as the
+		chain does not change.
+			sky = also make sure the sky statistics (see computeSkySummary) are in the
+				summary; they need the attitude and are only computed when asked for
+		"""
+		summary = self.__dict__.get('_summary')
+		if summary is None:
+			summary = self.readSummary()
+			if summary is None:
+				summary = self.computeSummary()
+				self.writeSummary(summary)
+			self.__dict__['_summary'] = summary
+
+		if sky and 'sky' not in summary and not summary['isEmpty']:
+			summary['sky'] = self.computeSkySummary()
+			self.writeSummary(summary)
+		return summary
+
+	def summaryStamp(self):
+		""" Returns the size and modification time of the file the summary is computed from, None if not known """
+		sourceFile = self.__dict__.get('_sourceFile')
+		if sourceFile is not None and os.path.isfile(sourceFile):
+			st = os.stat(sourceFile)
+			return [st.st_size, st.st_mtime]
+		return None
+
+	def readSummary(self):
+		""" Returns the summary written next to the chain, None if there is none for the current chain """
+		import json
+
+		summaryFile = self.__dict__.get('_summaryFile')
+		stamp = self.summaryStamp()
+		if stamp is None or not os.path.isfile(summaryFile):
+			return None
+		with open(summaryFile, 'r') as fid:
+			summary = json.load(fid)
+		if summary.get('version') != self.SUMMARY_VERSION or summary.get('stamp') != stamp:
+			return None
+		return summary
+
+	def writeSummary(self, summary):
+		""" Writes the summary next to the chain, if the chain is a file """
+		import json
+
+		summaryFile = self.__dict__.get('_summaryFile')
+		stamp = self.summaryStamp()
+		if stamp is None:
+			return
+		summary['stamp'] = stamp
+		try:
+			if not os.path.isdir(os.path.dirname(summaryFile)):
+				os.makedirs(os.path.dirname(summaryFile))
+			with open(summaryFile + '.tmp', 'w') as fid:
+				json.dump(summary, fid)
+			os.replace(summaryFile + '.tmp', summaryFile)
+		except (IOError, OSError):
+			print('could not write the summary ' + summaryFile)
+
+	def segmentIndex(self):
+		""" Returns the index of impact_list.txt and segment_list.txt shared by all impacts """
+		from segmentIndex import getSegmentIndex
+		return getSegmentIndex(self.BASE_DIR + self.dataDir)
+
 	def getVetoList(self):
-		df_veto = pd.read_csv(self.BASE_DIR + self.dataDir + '/impact_list.txt', header = 'infer',
-				delim_whitespace = True)
-		return df_veto
+		return self.segmentIndex().df_veto
 
 	
-	def getisImpact(self, df_veto):
+	def getisImpact(self, df_veto = None):
+		""" isImpact flag from the impact list, looked up in the shared index unless df_veto is given """
+		if df_veto is None:
+			return self.segmentIndex().isImpact(self.segment)
 
 		try:
 			index = df_veto.index[df_veto['segment'] == self.segment][0]
@@ -308,7 +550,11 @@ class impactClass:
 		else:
 			return df_veto['isImpact'].values[index]
 
-	def getisGlitch(self, df_veto):
+	def getisGlitch(self, df_veto = None):
+		""" isGlitch flag from the impact list, looked up in the shared index unless df_veto is given """
+		if df_veto is None:
+			return self.segmentIndex().isGlitch(self.segment)
+
 		try:
 			index = df_veto.index[df_veto['segment'] == self.segment][0]
 		except IndexError:
@@ -318,16 +564,8 @@ class impactClass:
 			return df_veto['isGlitch'].values[index]
 
 	def getisValidSearch(self):
-		search_times = pd.read_csv(self.BASE_DIR + self.dataDir + '/segment_list.txt',
-				header = None, names = ['segment'], delim_whitespace = True)
-		
 		# Jakes list does not cover all time, keep segments only within list
-		if self.segment > max(search_times['segment'].values):
-			return True
-		elif int(self.segment) in search_times['segment'].values:
-			return True
-		else:
-			return False
+		return self.segmentIndex().isValidSearch(self.segment)
 		
 	def summaryString(self, percent_sky = 0.1,
 			keys = ['Ptot','lat','lon','rx','ry','rz'],
@@ -342,23 +580,35 @@ class impactClass:
 
 		p = np.zeros([np.shape(keys)[0],3])
 
+		# percentiles and face histogram from the summary of the chain, sky angles from
+		# findSkyAngles if it was called, else from the summary
+		needSky = any(key not in self.__dict__ for key in self.SUMMARY_SKY)
+		summary = self.getSummary(sky = needSky)
+		percentiles = self.SUMMARY_PERCENTILES
 		for idx, kk in enumerate(keys) :
-			p[idx, :] = np.percentile(self.getParam(kk) * scale[idx], [50, 2.75, 97.5])
+			if kk in summary['percentile']:
+				pct = summary['percentile'][kk]
+				p[idx, :] = [pct[percentiles.index(q)] * scale[idx] for q in [50, 2.75, 97.5]]
+			else:
+				p[idx, :] = np.percentile(self.getParam(kk) * scale[idx], [50, 2.75, 97.5])
 
 		faceNames = ['+x+x','+x+y','+y+y','+y-x','-x-x','-x-y','-y-y','-y+x','+z+z','-z-z']
-		cf, bf = np.histogram(self.face, bins=np.arange(0.5, 11, 1),density = True)
+		cf = np.asarray(summary['faceHist'])
+
+		sky = dict((key, self.__dict__[key] if key in self.__dict__ else summary['sky'][key])
+				for key in self.SUMMARY_SKY)
 
 		if np.max(cf) > 0.7 :
 			faceText = faceNames[np.argmax(cf)]
 		else:
 			faceText = '-'
 
-		if self.skyArea < (percent_sky * 41253) :
-			areaText = str('{0:.0f}'.format(self.skyArea))
-			SClatText = str('{0:.0f}'.format(self.lat_c))
-			SClonText = str('{0:.0f}'.format(self.lon_c))
-			SunlatText = str('{0:.0f}'.format(self.lat_c_sun))
-			SunlonText = str('{0:.0f}'.format(self.lon_c_sun))
+		if sky['skyArea'] < (percent_sky * 41253) :
+			areaText = str('{0:.0f}'.format(sky['skyArea']))
+			SClatText = str('{0:.0f}'.format(sky['lat_c']))
+			SClonText = str('{0:.0f}'.format(sky['lon_c']))
+			SunlatText = str('{0:.0f}'.format(sky['lat_c_sun']))
+			SunlonText = str('{0:.0f}'.format(sky['lon_c_sun']))
 		else :
 			areaText = '-'
 			SClatText = '-'
@@ -416,39 +666,28 @@ class impactClass:
 	#      Coordinate Transformations        #
 	# ---------------------------------------#
 
-	def getSCquats(self, doText = False):
+	def getSCquats(self, doText = False, interpolate = False):
 		"""
 		function to get spacecraft quaternions    
 		function to read SC quaternion file. Can either read a python binary file (faster, 
-		default) or an ASCII text file (slower)
+		default) or an ASCII text file (slower). The file is opened once and shared by
+		every impact, see attitudeTools
+			interpolate = SLERP between the samples around gps instead of taking the
+				nearest one
 		
 		Ira Thorpe
 		2018-05-12
 		"""
-		#import libraries
-		import numpy as np, quaternion
-		import os
-		import pathlib
-		
+		from attitudeTools import getAttitude
 		
 		# load Quaternion data
 		if doText:
 			quatFile = self.BASE_DIR + '/rawData/allQuats.txt'
-			dat = np.loadtxt(quatFile)
 		else :
 			quatFile = self.BASE_DIR + self.dataDir + '/quats.npy'
-			dat = np.load(quatFile)
 			
-		# separate out gps time (1st column) from quaternions (columns 2-5)
-		allGPS = np.array(dat[...,0])
-		allQuats = quaternion.as_quat_array(np.array(dat[...,[4,1,2,3]]))
-		
-		# find nearest gps time
-		idxmin = (np.abs(allGPS - self.gps)).argmin()
-		impQuat = allQuats[idxmin]
-
-		# return the quaternion
-		return impQuat
+		# quaternion at the nearest gps time
+		return getAttitude(quatFile, doText = doText).getQuats(self.gps, interpolate = interpolate)
 
 	def ECI_to_SUN(self):
 		"""
@@ -460,31 +699,11 @@ class impactClass:
 		prograde = -90
 		retrograde = +90
 		"""
-		import numpy as np, quaternion
-		import os
-		import pathlib
-		from astropy.time import Time
-		from astropy.coordinates import get_body
+		from frameTools import ECI_to_SUN, EPHEMERIS_FILE
 
-		# quaternion to rotate from ECI to Sun (place +x in Sunward direction)
-		# Get sun location 
-		s = get_body('sun', Time(self.gps ,format = 'gps', scale = 'utc'))
-		sun_dec_rad = s.dec.value * np.pi / 180
-		sun_ra_rad = s.ra.value * np.pi / 180
-
-		# unit vector in sunward direction
-		usun = np.array([np.cos(sun_dec_rad) * np.cos(sun_ra_rad),
-					np.cos(sun_dec_rad) * np.sin(sun_ra_rad), 
-					np.sin(sun_dec_rad)])
-		
-		# find quaternion to go between x and sunward direction
-		ux = np.array([1, 0, 0])
-		usun_x_ux = np.cross(usun, ux)
-		qr_ECIx_sun = quaternion.as_quat_array([1 + np.dot(ux, usun),
-											usun_x_ux[0],
-											usun_x_ux[1],
-											usun_x_ux[2]])
-		qr_ECIx_sun = qr_ECIx_sun / quaternion.np.abs(qr_ECIx_sun)
+		# quaternion to rotate from ECI to Sun (place +x in Sunward direction), from the
+		# Sun ephemeris table of the data directory
+		qr_ECIx_sun = ECI_to_SUN(self.gps, cacheFile = self.BASE_DIR + self.dataDir + '/' + EPHEMERIS_FILE)
 
 		return qr_ECIx_sun
     
@@ -497,140 +716,120 @@ class impactClass:
 		apex direction (Earth's motion) = -90
 		anti-apex direction = +90
 		"""
-		import numpy as np, quaternion
-		from datetime import datetime, timedelta
+		from frameTools import ECI_to_MM
+
+		# closed form rotation from the position in Earth's orbit relative to Spring Equinox
+		Qc = ECI_to_MM(self.gps)
 
-		# find position in Earth's orbit relative to Spring Equinox
-		GPSfromUTC = (datetime(1980,1,6) - datetime(1970,1,1)).total_seconds()
-		curDate = datetime.utcfromtimestamp(self.gps + GPSfromUTC) 
-		secOfYear = (curDate - datetime(curDate.year,3,21)).total_seconds()
-		phi = (secOfYear/3.154E7)*2*np.pi
-        
-		# Rotation matrix from ECI to MM
-		theta = 23.5*np.pi/180 #Earth's axial tilt
-		R = np.array([[np.cos(phi), np.sin(phi)*np.cos(theta), np.sin(theta)*np.sin(theta)], 
-						[-np.sin(phi), np.cos(phi)*np.cos(theta), np.cos(phi)*np.sin(theta)], 
-						[0, -np.sin(theta),np.cos(theta)]])
-
-		# Convert to quaternion
-		tr = R[0,0] + R[1,1] + R[2,2]
-
-		if tr > 0.0 :
-			S = np.sqrt(tr+1.0) * 2
-			qw = 0.25 * S;
-			qx = (R[2,1] - R[1,2]) / S
-			qy = (R[0,2] - R[2,0]) / S
-			qz = (R[1,0] - R[0,1]) / S 
-		elif ((R[0,0] > R[1,1])& (R[0,0] > R[2,2]))  :
-			S = np.sqrt(1.0 + R[0,0] - R[1,1] - R[2,2]) * 2 
-			qw = (R[2,1] - R[1,2]) / S
-			qx = 0.25 * S
-			qy = (R[0,1] + R[1,0]) / S 
-			qz = (R[0,2] + R[2,0]) / S 
-		elif (R[1,1] > R[2,2]) : 
-			S = np.sqrt(1.0 + R[1,1] - R[0,0] - R[2,2]) * 2 
-			qw = (R[0,2] - R[2,0]) / S
-			qx = (R[0,1] + R[1,0]) / S 
-			qy = 0.25 * S
-			qz = (R[1,2] + R[2,1]) / S 
-		else  :
-			S = np.sqrt(1.0 + R[2,2] - R[0,0] - R[1,1]) * 2
-			qw = (R[1,0] - R[0,1]) / S
-			qx = (R[0,2] + R[2,0]) / S
-			qy = (R[1,2] + R[2,1]) / S
-			qz = 0.25 * S
-
-		Q = quaternion.as_quat_array([qw,qx,qy,qz])
-		Qc = quaternion.np.conjugate(Q)
-        
 		return Qc
 
 
 
 	# function to locate impact and estimate area using healpix binning.
-	def findSkyAngles(self, CI = 0.68, nside = 32):
+	def findSkyAngles(self, CI = 0.68, nside = 32, keepDense = True):
 		"""
 		function to determine impact sky area using HEALPIX binning. Returns 1 sigma sky area in 
 		square degrees and central point latitude and longitude. If dictionary passed to the 
 		function has sun-frame angles in addition to SC-frame angles, it will operate on both.
+		The sky maps are kept as multi-order maps (skyMap, skyMap_sun, see
+		skyTools.multiOrderMap) and, if keepDense, as dense nside maps (healPix, healPix_sun)
 		Arguments
 			data = dictionary containing chain data
 			CI = confidence interval for sky area
 			nside = HEALPIX number of sides
+			keepDense = also keep the dense maps; if not, healPix and healPix_sun are
+				binned again from the samples when they are read (see denseSkyMap)
 		
 		Ira Thorpe
 		2018-05-24
 		"""
 		#import libraries
-		import healpy as hp
 		import numpy as np
-		import matplotlib.pyplot as plt
+		from skyTools import SKY_CIS, multiOrderMaps
 
 		if self.isEmpty:
 			self.lat_c = None
 			self.lon_c = None
 			self.skyArea = None
 			self.healPix = None
+			self.skyAreas = None
+			self.skyMap = None
 
 			self.lat_c_sun = None
 			self.lon_c_sun = None
 			self.skyArea_sun = None
 			self.healPix_sun = None
+			self.skyAreas_sun = None
+			self.skyMap_sun = None
 
 			return self
 
-		# Build the HEALPIX map
-		npix = hp.nside2npix(nside)
-		mp = np.arange(npix)
+		# centroid and sky area, pixel indices and histograms are kept (see skyTools)
+		sky = self.getSkyLocalizer('sc')
+		lat_c, lon_c, area = sky.locate(self.N_1, CI, nside)
 
-		# Convert data to HEALPIX
-		dat_hp = hp.pixelfunc.ang2pix(nside, self.lon, self.lat, nest=False, lonlat=True)
-
-		# Make the histogram
-		bin_edges = np.arange(-0.5, npix + 0.5, 1.0)
-		bin_centers = np.arange(0, npix, 1.0)
-		cnt_hp, bins = np.histogram(dat_hp, bin_edges)
-		
-		# Measure centroid and sky area
-		cdf = np.cumsum(cnt_hp.astype('float')) / float(self.N_1)        
-		ilb = (np.abs(cdf - ((1.0 - CI) / 2.0))).argmin()
-		iub = (np.abs(cdf - (1.0 - ((1.0 - CI) / 2.0)))).argmin()
-		imed = (np.abs(cdf - 0.5)).argmin()
-		area = 41253.0 * float(iub - ilb) / float(npix)
-		lon_c, lat_c = hp.pixelfunc.pix2ang(nside, imed, nest = False, lonlat = True)
-		lon_c = np.mod(180 + lon_c, 360) - 180
-		
 		# put back into data dictionary
-		self.lat_c = lat_c
-		self.lon_c = lon_c
-		self.skyArea = area
-		self.healPix = cnt_hp / float(self.N_1)
+		self.skyNside = nside
+		self.lat_c = lat_c[0]
+		self.lon_c = lon_c[0]
+		self.skyArea = area[0]
+		if keepDense:
+			self.healPix = sky.healPix(self.N_1, nside)[0]
+		else:
+			self.__dict__.pop('healPix', None)
+		self.skyAreas = dict(zip(SKY_CIS, sky.credibleAreas(SKY_CIS, nside)[0]))
+		self.skyMap = multiOrderMaps(self.lon, self.lat, norm = self.N_1)[0]
 		
 		# if Sun angles are present, repeat for them
 		if hasattr(self, 'lon_sun'):
-			# Convert data to HEALPIX
-			dat_hp = hp.pixelfunc.ang2pix(nside, self.lon_sun, self.lat_sun, nest = False, lonlat = True)
+			sky = self.getSkyLocalizer('sun')
+			lat_c, lon_c, area = sky.locate(self.N_1, CI, nside)
 
-			# Make the histogram
-			cnt_hp, bins = np.histogram(dat_hp, bin_edges)
-		
-			# Measure sky area
-			cdf = np.cumsum(cnt_hp.astype('float')) / float(self.N_1)        
-			ilb = (np.abs(cdf - ((1.0 - CI) / 2.0))).argmin()
-			iub = (np.abs(cdf - (1.0 - ((1.0 - CI) / 2.0)))).argmin()
-			imed = (np.abs(cdf - 0.5)).argmin()
-			area = 41253.0 * float(iub - ilb) / float(npix)
-			lon_c, lat_c = hp.pixelfunc.pix2ang(nside, imed, nest = False, lonlat = True)
-			lon_c = np.mod(180 + lon_c, 360) - 180
-			
 			# put into dictionary
-			self.lat_c_sun = lat_c
-			self.lon_c_sun = lon_c
-			self.skyArea_sun = area
-			self.healPix_sun = cnt_hp / float(self.N_1)
+			self.lat_c_sun = lat_c[0]
+			self.lon_c_sun = lon_c[0]
+			self.skyArea_sun = area[0]
+			if keepDense:
+				self.healPix_sun = sky.healPix(self.N_1, nside)[0]
+			else:
+				self.__dict__.pop('healPix_sun', None)
+			self.skyAreas_sun = dict(zip(SKY_CIS, sky.credibleAreas(SKY_CIS, nside)[0]))
+			self.skyMap_sun = multiOrderMaps(self.lon_sun, self.lat_sun, norm = self.N_1)[0]
 
 		return self
 		
+	def denseSkyMap(self, sun = False):
+		"""
+		Returns the dense sky map (healPix, or healPix_sun if sun) of an impact whose dense
+		maps were not kept (findSkyAngles with keepDense = False). It is binned again from
+		the samples at the nside of findSkyAngles, on every access, and not kept.
+		"""
+		from skyTools import skyLocalizer
+
+		if self.__dict__['skyMap_sun' if sun else 'skyMap'] is None:
+			return None
+		if sun:
+			lon, lat = self.lon_sun, self.lat_sun
+		else:
+			lon, lat = self.lon, self.lat
+		return skyLocalizer(lon, lat).healPix(self.N_1, self.__dict__.get('skyNside', 32))[0]
+
+	def getSkyLocalizer(self, frame = 'sc'):
+		"""
+		Returns the skyLocalizer of the chain in the SC ('sc') or Sun ('sun') frame, kept
+		as long as the angles of the frame are the same arrays
+		"""
+		from skyTools import skyLocalizer
+
+		if frame == 'sun':
+			lon, lat = self.lon_sun, self.lat_sun
+		else:
+			lon, lat = self.lon, self.lat
+		cache = self.__dict__.setdefault('_sky', {})
+		if frame not in cache or cache[frame][0] is not lon or cache[frame][1] is not lat:
+			cache[frame] = (lon, lat, skyLocalizer(lon, lat))
+		return cache[frame][2]
+
 	# function to convert angles from SC frame to Sun-center frame (in degrees)
 	def SCtoSun(self):
 		"""
@@ -1196,19 +1395,8 @@ class impactClass:
 
 
 
-	def rotate_at_origin(self, df, facenumber, y_old = None, back = False):
-		# rotates face to origin
-		# if back, df is a numpy array
-		# else df is a dataframe
-
-		## 	 .  .        .   .
-		##            
-		## .      . -> .       .
-		##     o           o --   
-		## .     \.    .     x .
-
-		##   .  .        .   .
-
+	def faceBaseVector(self, facenumber):
+		""" Returns the bottom edge of a side face (0-7), from its first corner """
 		# fixes indexing problem, xsc[8] = xsc[0]
 		if (facenumber == 7):
 			base_vector = [self.xsc[0] - self.xsc[facenumber], 
@@ -1219,7 +1407,11 @@ class impactClass:
 		else:
 			print("facenumber = %s"%(facenumber), " is out of range")
 			raise ValueError
-			return
+		return base_vector
+
+	def faceAngle(self, facenumber):
+		""" Returns the angle a side face (0-7) is rotated by to lie along x """
+		base_vector = self.faceBaseVector(facenumber)
 
 		# unit version of base vector
 		unit_BV = base_vector / np.linalg.norm(base_vector)
@@ -1231,6 +1423,119 @@ class impactClass:
 		# some of the faces need to rotate larger angle
 		if facenumber in [0, 1, 7]:
 			theta = 2 * np.pi - theta
+		return theta
+
+	def faceTransforms(self):
+		"""
+		Returns the affine transforms from SC coordinates to the face-local 2D coordinates
+		of the LPF histograms, one per face: origin [10 x 2] and rotation [10 x 2 x 2],
+		local = rotation . ([x, y] - origin). Side faces (0-7) are moved to their first
+		corner and rotated to lie along x, as translate_to_origin and rotate_at_origin do;
+		the top and bottom (8, 9) keep x and y.
+		"""
+		if '_faceTransforms' not in self.__dict__:
+			origin = np.zeros((10, 2))
+			rotation = np.tile(np.eye(2), (10, 1, 1))
+			for f in range(8):
+				theta = self.faceAngle(f)
+				origin[f] = [self.xsc[f], self.ysc[f]]
+				rotation[f] = [[np.cos(theta), -np.sin(theta)],
+							[np.sin(theta), np.cos(theta)]]
+			self._faceTransforms = (origin, rotation)
+		return self._faceTransforms
+
+	def faceCoords(self, dictionary = None):
+		"""
+		Maps all samples to the local coordinates of their face in one pass, and keeps the
+		result for the chain of dictionary (default self.data).
+		Returns a dictionary of
+			u = position along the face (rotated x for side faces, x for top and bottom)
+			w = height on a side face (z), y for top and bottom
+			offsets = samples of face f are u[offsets[f]:offsets[f + 1]], samples with a
+				face outside 0-9 come last
+			n = number of samples of the chain
+		"""
+		if dictionary is None:
+			dictionary = self.data
+		cache = self.__dict__.get('_faceCoords')
+		if cache is not None and cache[0] is dictionary['rx']:
+			return cache[1]
+
+		face = np.asarray(dictionary['face'], dtype = float)
+		x = np.asarray(dictionary['rx'], dtype = float)
+		y = np.asarray(dictionary['ry'], dtype = float)
+		z = np.asarray(dictionary['rz'], dtype = float)
+
+		# faces outside 0-9 are sorted last, with the identity transform of face 8
+		f = np.where((face >= 0) & (face <= 9) & (face == np.floor(face)), face, 10).astype(int)
+		fi = np.minimum(f, 8)
+
+		origin, rotation = self.faceTransforms()
+		dx = x - origin[fi, 0]
+		dy = y - origin[fi, 1]
+		u = dx * rotation[fi, 0, 0] + dy * rotation[fi, 0, 1]
+		w = np.where(f < 8, z, y)
+
+		order = np.argsort(f, kind = 'mergesort')
+		coords = {'u' : u[order], 'w' : w[order], 'n' : len(face),
+				'offsets' : np.searchsorted(f[order], np.arange(11))}
+		self._faceCoords = (dictionary['rx'], coords)
+		return coords
+
+	def faceHist(self, facenumber, N, dictionary = None, dropSingle = True):
+		"""
+		2D histogram of the samples of a face in its local coordinates, as hist does for
+		a translated and rotated face, from the cached faceCoords.
+			N = number of bins along the long side of the LPF
+			dropSingle = drop a face with a single sample (np.histogram2d bug, see hist)
+		Returns Hist (normalized by the number of samples / N), xedges, and zedges (side
+		faces) or yedges (top and bottom)
+		"""
+		coords = self.faceCoords(dictionary)
+		start, stop = coords['offsets'][facenumber], coords['offsets'][facenumber + 1]
+		u = coords['u'][start:stop]
+		w = coords['w'][start:stop]
+		length_df = coords['n'] / N
+
+		# deals with numpy hist2d bug
+		# if only 1 hit, just drop the side
+		if dropSingle and len(u) == 1:
+			u = u[:0]
+			w = w[:0]
+
+		Ltotal = self.xsc[5] - self.xsc[0]                   
+		Wtotal = self.ysc[2] - self.ysc[7]
+
+		# Bins / Unit Length
+		ndensity = N / Ltotal
+
+		if facenumber == 8 or facenumber == 9:
+			binsheight = int(Wtotal * ndensity)  
+			Hist, xedges, yedges = np.histogram2d(u, w, bins = [N, binsheight],
+					range = [[self.xsc[0], self.xsc[5]],[self.ysc[7], self.ysc[2]]])
+			return Hist.T / length_df, xedges, yedges
+
+		base_vector = self.faceBaseVector(facenumber)
+		bins_x = int(np.linalg.norm(base_vector) * ndensity)
+		bins_z = int(self.H * ndensity)  
+		Hist, xedges, zedges = np.histogram2d(u, w, bins = [bins_x, bins_z],
+			range = [[0, np.linalg.norm(base_vector)], [0, self.H]])
+		return Hist.T / length_df, xedges, zedges
+
+	def rotate_at_origin(self, df, facenumber, y_old = None, back = False):
+		# rotates face to origin
+		# if back, df is a numpy array
+		# else df is a dataframe
+
+		## 	 .  .        .   .
+		##            
+		## .      . -> .       .
+		##     o           o --   
+		## .     \.    .     x .
+
+		##   .  .        .   .
+
+		theta = self.faceAngle(facenumber)
 
 		# backwards rotation
 		if back:
@@ -1381,8 +1686,9 @@ class impactClass:
 
 		return
 
-	def makeTopPatch(self, ax, df, facenumber, N, length_df, 
+	def makeTopPatch(self, ax, Hist, xedges, yedges, facenumber, 
 			norm, cmap = colormap.parula):
+		# Hist, xedges, yedges = histogram of the face, see faceHist
 		alpha = 1 
 		ec = 'white'
 		lw = .02 
@@ -1392,32 +1698,6 @@ class impactClass:
 			z = 0   # Zposition            
 		elif facenumber == 9:
 			z = self.H
-		#to Shift graphing Position, Must shift everything
-
-		Ltotal = self.xsc[5] - self.xsc[0]                   
-		Wtotal = self.ysc[2] - self.ysc[7]
-
-		# Bins / Unit Length
-		ndensity = N / Ltotal
-		binsheight = int(Wtotal * ndensity)  
-		
-
-		minfacex = self.xsc[0]
-		maxfacex = self.xsc[5]
-
-		minfacey = self.ysc[7]
-		maxfacey = self.ysc[2]
-		
-		#input data
-		xs = df.loc[:, 'xloc']
-		ys = df.loc[:, 'yloc']
-
-		#Creates Histogram (NxN), Xedges (N), and Yedges (N)
-		Hist, xedges, yedges = np.histogram2d(xs, ys, bins = [N, binsheight],
-				range = [[minfacex, maxfacex],[minfacey, maxfacey]])
-		
-		#transforms the Histogram so it can be graphed
-		Hist = Hist.T / length_df
 
 		# finds slopes of the outside lines
 		mtright, btright = self.findmb(self.xsc[3], self.ysc[3], self.xsc[4], self.ysc[4])
@@ -1484,9 +1764,6 @@ class impactClass:
 		else:
 			norm = matplotlib.colors.Normalize(0, 1)
 
-		# converts dictionary to pandas Dataframe
-		df = self.dictionaryToDataFrame(dictionary)
-
 		# initialize figure
 		fig3D = plt.figure(figsize = (6, 6))
 
@@ -1500,19 +1777,10 @@ class impactClass:
 
 
 		for f in np.arange(0, 10):
-			#Gets only values on one face
-			df_new = self.dataFrameOnlyFace(df, f)
-			
 			#vertical sides
 			if f < 8:
-				# Translated
-				df_new = self.translate_to_origin(df_new, f)
-
-				# Rotated
-				df_new, theta = self.rotate_at_origin(df_new, f)
-
-				# makes historgram
-				Hist, xedges, zedges = self.hist(df_new, f, N, length_df = len(df.index) / N)
+				# makes historgram in the face frame (samples mapped once, see faceCoords)
+				Hist, xedges, zedges = self.faceHist(f, N, dictionary)
 
 				# rotates histogram edges (creates y edges)
 				xedges, yedges = self.rotate_at_origin(xedges, f, back = True)
@@ -1523,8 +1791,8 @@ class impactClass:
 
 			else:
 				# makes top and bottom patches
-				self.makeTopPatch(ax3d, df_new, f, N, 
-						length_df = len(df.index) / N, norm = norm, cmap = my_cmap)
+				Hist, xedges, yedges = self.faceHist(f, N, dictionary, dropSingle = False)
+				self.makeTopPatch(ax3d, Hist, xedges, yedges, f, norm = norm, cmap = my_cmap)
 		if return_ax:
 			return ax3d, fig3D
 		else:
@@ -1709,9 +1977,6 @@ class impactClass:
 		else:
 			norm = matplotlib.colors.Normalize(0, 1)
 
-		# converts dictionary to pandas Dataframe
-		df = self.dictionaryToDataFrame(dictionary)
-
 		#Parameterizing Visuals
 		fig = plt.figure(figsize = (10,10))              #size of figure
 		ax = fig.add_subplot(1,1,1, aspect = 'equal')    #add subplot with equal axes
@@ -1721,19 +1986,10 @@ class impactClass:
 		ax.get_yaxis().set_visible(False)
 
 		for f in np.arange(0, 10):
-			#Gets only values on one face
-			df_new = self.dataFrameOnlyFace(df, f)
-			
 			#vertical sides
 			if f < 8:
-				# Translated
-				df_new = self.translate_to_origin(df_new, f)
-
-				# Rotated
-				df_new, theta = self.rotate_at_origin(df_new, f)
-
-				# makes historgram
-				Hist, xedges, zedges = self.hist(df_new, f, N, length_df = len(df.index) / N)
+				# makes historgram in the face frame (samples mapped once, see faceCoords)
+				Hist, xedges, zedges = self.faceHist(f, N, dictionary)
 
 				# Rotates flat
 				yedges = zedges
@@ -1745,7 +2001,7 @@ class impactClass:
 				xedges, yedges = self.translate_from_origin(xedges, yedges, f)
 
 			else:
-				Hist, xedges, yedges = self.hist(df_new, f, N, length_df = len(df.index) / N)
+				Hist, xedges, yedges = self.faceHist(f, N, dictionary)
 				if f == 9:
 					for i in range(len(yedges)):
 						yedges[i] += self.ysc[2] - self.ysc[7] + self.H
@@ -1763,6 +2019,164 @@ class impactClass:
 		return fig
 
 
+def batchSCtoSun(impacts, store = None):
+	"""
+	Converts the angles of a list of impacts from the SC frame to the sun-centered frame
+	(sets lat_sun and lon_sun of every impact, as SCtoSun) with one attitude lookup and one
+	vectorized rotation over the samples of all impacts.
+	Arguments
+		impacts = list of impactClass
+		store = chain store holding the chains of the impacts; if it holds the lat_sun and
+			lon_sun columns (see chainStore.writeSunColumns) they are read from it instead
+	Returns impacts
+	"""
+	from attitudeTools import getAttitude
+	from frameTools import ECI_to_MM, rotateSCtoSun
+	import quaternion
+
+	if store is not None and store.hasColumns(['lat_sun', 'lon_sun']):
+		for impact in impacts:
+			if impact.isEmpty:
+				impact.lat_sun = None
+				impact.lon_sun = None
+			else:
+				impact.lat_sun = store.getChain(impact.segment, 'lat_sun')
+				impact.lon_sun = store.getChain(impact.segment, 'lon_sun')
+		return impacts
+
+	for impact in impacts:
+		if impact.isEmpty:
+			impact.lon_sun = None
+			impact.lat_sun = None
+	full = [impact for impact in impacts if not impact.isEmpty]
+
+	# impacts sharing a quaternion file are rotated together
+	groups = {}
+	for impact in full:
+		groups.setdefault(impact.BASE_DIR + impact.dataDir + '/quats.npy', []).append(impact)
+
+	for quatFile, group in groups.items():
+		gps = np.array([impact.gps for impact in group], dtype = float)
+		qr_ECI_SC = getAttitude(quatFile).getQuatArray(gps)
+		qr_ECI_MM = quaternion.as_float_array(ECI_to_MM(gps))
+
+		lengths = [len(impact.lat) for impact in group]
+		index = np.repeat(np.arange(len(group)), lengths)
+		lat_sun, lon_sun = rotateSCtoSun(np.concatenate([impact.lat for impact in group]),
+				np.concatenate([impact.lon for impact in group]), qr_ECI_SC, qr_ECI_MM, index)
+
+		splits = np.cumsum(lengths)[:-1]
+		for impact, lat, lon in zip(group, np.split(lat_sun, splits), np.split(lon_sun, splits)):
+			impact.lat_sun = lat
+			impact.lon_sun = lon
+	return impacts
+
+
+def batchFindSkyAngles(impacts, CI = 0.68, nside = 32, keepDense = True):
+	"""
+	Sets the sky angles, areas and maps of a list of impacts, as findSkyAngles, binning
+	the samples of all impacts together (see skyTools)
+	Arguments
+		impacts = list of impactClass
+		CI = confidence interval for sky area
+		nside = HEALPIX number of sides
+		keepDense = also keep the dense maps (healPix), not only the multi-order ones
+	Returns impacts
+	"""
+	from skyTools import skyLocalizer, SKY_CIS, multiOrderMaps
+
+	full = []
+	for impact in impacts:
+		if impact.isEmpty:
+			impact.findSkyAngles(CI = CI, nside = nside, keepDense = keepDense)
+		else:
+			full.append(impact)
+	if len(full) == 0:
+		return impacts
+
+	offsets = np.concatenate(([0], np.cumsum([len(impact.lat) for impact in full])))
+	N_1 = np.array([impact.N_1 for impact in full], dtype = float)
+
+	frames = [('', 'lon', 'lat', full)]
+	sun = [impact for impact in full if hasattr(impact, 'lon_sun')]
+	if len(sun) == len(full):
+		frames.append(('_sun', 'lon_sun', 'lat_sun', full))
+	else:
+		# some impacts without Sun angles, as findSkyAngles does one by one
+		for impact in sun:
+			impact.findSkyAngles(CI = CI, nside = nside, keepDense = keepDense)
+
+	for suffix, lonName, latName, group in frames:
+		lon = np.concatenate([getattr(impact, lonName) for impact in group])
+		lat = np.concatenate([getattr(impact, latName) for impact in group])
+		sky = skyLocalizer(lon, lat, offsets)
+		lat_c, lon_c, area = sky.locate(N_1, CI, nside)
+		areas = sky.credibleAreas(SKY_CIS, nside)
+		maps = multiOrderMaps(lon, lat, offsets, norm = N_1)
+		for i, impact in enumerate(group):
+			impact.skyNside = nside
+			setattr(impact, 'lat_c' + suffix, lat_c[i])
+			setattr(impact, 'lon_c' + suffix, lon_c[i])
+			setattr(impact, 'skyArea' + suffix, area[i])
+			setattr(impact, 'skyAreas' + suffix, dict(zip(SKY_CIS, areas[i])))
+			setattr(impact, 'skyMap' + suffix, maps[i])
+		if keepDense:
+			healPix = sky.healPix(N_1, nside)
+			for i, impact in enumerate(group):
+				setattr(impact, 'healPix' + suffix, healPix[i])
+		else:
+			for impact in group:
+				impact.__dict__.pop('healPix' + suffix, None)
+	return impacts
+
+
+# chain store directory -> chainStore, opened once per worker process of impactClassList
+_listStores = {}
+
+
+def keepImpact(impact, getValid = True, include_marginal = True):
+	""" True if impactClassList keeps the impact (not a glitch, an impact, dfrac if not marginal) """
+	if not getValid:
+		return True
+	if impact.isGlitch:
+		return False
+	elif impact.isImpact:
+		return include_marginal or impact.dfrac >= 0.7
+	print('This is neither an impact nor a glitch, \n segment?')
+	return False
+
+
+def loadImpactChunk(job):
+	"""
+	Worker of impactClassList: reads a chunk of impacts, converts them to the Sun frame,
+	finds their sky angles and returns the ones that are kept (see keepImpact).
+	Arguments
+		job = (chainFiles, BASE_DIR, dataDir, storeDir, getValid, include_marginal),
+			storeDir is None to read the pickles in chainFiles
+	"""
+	chainFiles, BASE_DIR, dataDir, storeDir, getValid, include_marginal = job
+
+	store = None
+	if storeDir is not None:
+		from chainStore import chainStore
+		if storeDir not in _listStores:
+			_listStores[storeDir] = chainStore(storeDir)
+		store = _listStores[storeDir]
+
+	impacts = [impactClass(chainFile, BASE_DIR = BASE_DIR, dataDir = dataDir, store = store)
+			for chainFile in chainFiles]
+	batchSCtoSun(impacts, store = store)
+
+	# only the multi-order sky maps are kept for the whole list
+	batchFindSkyAngles(impacts, keepDense = False)
+
+	impact_list = []
+	for impact in impacts:
+		if keepImpact(impact, getValid, include_marginal):
+			impact_list.append(impact)
+	return impact_list
+
+
 class impactClassList(list):
 	"""
 	A Class for dealing with a list of impact Class instances
@@ -1770,11 +2184,17 @@ class impactClassList(list):
 
 	def __init__(self, grs = 1, 
 				getValid = True, BASE_DIR = None, dataDir = '/data', directory = '/data/ONLY_IMPACTS', 
-				include_marginal = True):
+				include_marginal = True, store = None, nproc = 1, threads = False, chunkSize = 32):
 		"""
 		Assumes we are running program from Analysis/scripts
 
 		BASE_DIR = Directory where /Analysis is
+		store = chain store to read instead of the pickles in directory, either a
+			chainStore or its directory relative to BASE_DIR (e.g. '/data/ONLY_IMPACTS_store')
+		nproc = number of workers reading the impacts (None for one per core, 1 reads them
+			here). Only the impacts that are kept are sent back, sorted by gps as before
+		threads = use a pool of threads instead of processes
+		chunkSize = number of impacts a worker reads at a time, bounds the memory used
 		"""
 		# Sets up directory structure
 		if BASE_DIR is None:
@@ -1783,56 +2203,114 @@ class impactClassList(list):
 		else:
 			self.BASE_DIR = str(BASE_DIR)
 
-		self.dataPath = pathlib.Path(self.BASE_DIR + directory)
+		storeDir = None
+		if store is not None:
+			from chainStore import chainStore
+			if not isinstance(store, chainStore):
+				store = chainStore(self.BASE_DIR + store)
+			if store.grs != grs:
+				raise ValueError('chain store %s holds GRS %i, not %i'%(store.storeDir, store.grs, grs))
+			self.dataPath = pathlib.Path(store.storeDir)
+			storeDir = os.path.abspath(store.storeDir)
+			_listStores[storeDir] = store
+			chainFiles = list(store.segments)
+			print("Reading through chain store")
+		else:
+			self.dataPath = pathlib.Path(self.BASE_DIR + directory)
 		
-		pickles = list(self.dataPath.glob('*_grs1.pickle'))
-		print("Reading through pickle files")
+			pickles = list(self.dataPath.glob('*_grs1.pickle'))
+			print("Reading through pickle files")
 
-		impact_list = []
-
-		for p in pickles:
 			# identify segment
-			segment = str(p.stem[0:10])
-			chainFile = str(self.dataPath) + '/' + str(segment) +'_grs%i'%grs + '.pickle'
-
-			impact = impactClass(chainFile, BASE_DIR = BASE_DIR, dataDir = dataDir)
-			impact = impact.SCtoSun()
-			impact = impact.findSkyAngles()
-			if getValid:
-				if impact.isGlitch:
-					continue
-				elif impact.isImpact:
-					if include_marginal:
-						impact_list.append(impact)
-						self.impact_list = impact_list
-					else:
-						if impact.dfrac < 0.7:
-							continue
-						else:
-							impact_list.append(impact)
-							self.impact_list = impact_list
-				else:
-					print('This is neither an impact nor a glitch, \n segment?')
-					continue
+			chainFiles = [str(self.dataPath) + '/' + str(p.stem[0:10]) +'_grs%i'%grs + '.pickle'
+					for p in pickles]
+
+		jobs = [(chainFiles[i:i + chunkSize], self.BASE_DIR, dataDir, storeDir, getValid, include_marginal)
+				for i in range(0, len(chainFiles), chunkSize)]
+
+		impact_list = []
+		if nproc == 1 or len(jobs) < 2:
+			for chunk in map(loadImpactChunk, jobs):
+				impact_list.extend(chunk)
+		else:
+			if threads:
+				from multiprocessing.pool import ThreadPool
+				pool = ThreadPool(nproc)
 			else:
-				impact_list.append(impact)
+				import multiprocessing
+				pool = multiprocessing.Pool(nproc)
+			try:
+				# chunks come back in order, one at a time
+				for chunk in pool.imap(loadImpactChunk, jobs):
+					impact_list.extend(chunk)
+			finally:
+				pool.close()
+				pool.join()
 
-		impact_list.sort(key=operator.attrgetter('gps'))
-		self.impact_list = impact_list
+		self.setImpacts(impact_list)
 
 		return
 
+	@classmethod
+	def fromImpacts(cls, impacts, BASE_DIR = None, dataPath = None):
+		"""
+		Returns an impactClassList of impacts that are already read (nothing is read or
+		copied), e.g. a selection of another list
+		"""
+		self = cls.__new__(cls)
+		self.BASE_DIR = BASE_DIR
+		self.dataPath = dataPath
+		self.setImpacts(impacts)
+		return self
+
+	def setImpacts(self, impacts):
+		"""
+		Sets the impacts of the list, sorted by gps, and indexes them by segment and gps
+		"""
+		self.impact_list = sorted(impacts, key=operator.attrgetter('gps'))
+		self.gpsIndex = np.array([impact.gps for impact in self.impact_list], dtype = float)
+
+		# segment -> impacts, segment -> position in impact_list
+		self.bySegment = {}
+		self.positions = {}
+		for i, impact in enumerate(self.impact_list):
+			self.bySegment.setdefault(impact.segment, []).append(impact)
+			self.positions.setdefault(impact.segment, i)
+
 	def getImpact(self, segments):
+		""" Returns the impacts of a segment or a list of segments """
 		if type(segments) != list:
 			segments = [segments]
 		imp_list = []
 		for s in segments:
-			for imp in self.impact_list:
-				#print(imp.segment, imp.gps, s)
-				if imp.segment == s:
-					imp_list.append(imp)
+			imp_list.extend(self.bySegment.get(s, []))
 		return imp_list
 
+	def between(self, gps_start, gps_stop):
+		""" Returns the impacts with gps_start <= gps <= gps_stop, sorted by gps """
+		first = np.searchsorted(self.gpsIndex, gps_start, side = 'left')
+		last = np.searchsorted(self.gpsIndex, gps_stop, side = 'right')
+		return self.impact_list[first:last]
+
+	def nextImpact(self, segment):
+		""" Returns the impact after the one of segment (by gps), None for the last one """
+		i = self.positions[segment] + 1
+		return self.impact_list[i] if i < len(self.impact_list) else None
+
+	def prevImpact(self, segment):
+		""" Returns the impact before the one of segment (by gps), None for the first one """
+		i = self.positions[segment] - 1
+		return self.impact_list[i] if i >= 0 else None
+
+	def select(self, predicate):
+		"""
+		Returns an impactClassList of the impacts for which predicate(impact) is True. The
+		impacts are shared with this list, not copied.
+			e.g. impacts.select(lambda impact: impact.dfrac > 0.7)
+		"""
+		return impactClassList.fromImpacts([impact for impact in self.impact_list if predicate(impact)],
+				BASE_DIR = self.BASE_DIR, dataPath = self.dataPath)
+
 	def summaryTable(self, percent_sky = 0.1, keys = ['Ptot','lat','lon','rx','ry','rz'],ephem = []):
 		
 		if len(ephem) > 0 :
@@ -1965,6 +2443,14 @@ class impactClassList(list):
 
 	def credible_interval(self, impact, key, credible = 0.90, getMedian = False):
 
+		# credible levels of the summary are not computed again
+		if key in impact.SUMMARY_PARAMS and credible in impact.SUMMARY_CREDIBLES:
+			cred = impact.getSummary()['credible'][key]
+			credible_up, credible_down = cred[1 + impact.SUMMARY_CREDIBLES.index(credible)]
+			if getMedian:
+				return credible_up, credible_down, cred[0]
+			return credible_up, credible_down
+
 		data = impact.getParam(key) #self.impact_list.sort(key=operator.attrgetter(key))
 
 		#First sorts data in order
@@ -2003,7 +2489,10 @@ class impactClassList(list):
 												 getMedian = True)
 			cred_up[i] = c_up
 			cred_down[i] = c_down
-			stdev[i] = np.std(sortlist[i].getParam(param))
+			if param in sortlist[i].SUMMARY_PARAMS:
+				stdev[i] = sortlist[i].getSummary()['std'][param]
+			else:
+				stdev[i] = np.std(sortlist[i].getParam(param))
 			median_list[i] = median
 
 		if getMedian:
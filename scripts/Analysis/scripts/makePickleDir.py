@@ -5,12 +5,18 @@
 
 # import libraries
 import os
-import fnmatch
 #from pathlib import PurePath
 import tarfile
 from microTools import readRawChain
+from chainTools import readChain, readTarChain, readImpactChain, tarMember
+from runIndex import runIndex, getGRS
+from chainStore import buildStore
 import shutil
 import datetime
+import time
+import json
+import multiprocessing
+from argparse import ArgumentParser
 
 import numpy as np
 import re
@@ -23,21 +29,33 @@ import string
 
 
 
-def getGPS(regex, f):
-	if re.search(regex, f):
-		gps = re.search(r'\d+', f).group(0)
-		return gps
-
-
 ## Define Directories
 outDir = '/local/data/ltpda/work/micrometeoroid/pyCatalog_0726'#/pyCatalog_ALL_0720'
 tmpDir = '/Home/lhea/shouriha/tmp' #'/local/data/ltpda/work/micrometeoroid/tmp'
 baseName = '/local/data/ltpda/work/micrometeoroid/Aug2017results'
 
+# Read the chain files straight out of the tarballs instead of
+# extracting them to tmpDir and cleaning up afterwards
+streamTar = True
+
+
+
+# function to parse a chain file, either from disk or from an open tarball
+def loadChainFile(chainFile, tar = None, burnIn = 0.0, lastN = None):
+	"""
+		Parses a chain file into an array, keeping only the samples after burn in
+		(or the last lastN samples). If tar is given, chainFile is the name of the
+		member inside the tarball and it is read as an in-memory stream, so
+		nothing is written to the scratch disk.
+	"""
+	if tar is None:
+		return readChain(chainFile, burnIn = burnIn, lastN = lastN)
+
+	return readTarChain(tar, chainFile, burnIn = burnIn, lastN = lastN)
 
 
 # function to read chain files as output by MCMC tool
-def readRawChain(chainDir,grs = 1, burnIn = 0.5, outDir='data'):
+def readRawChain(chainDir,grs = 1, burnIn = 0.5, outDir='data', tar = None):
 	"""
 		    Function to read micrometeoroite MCMC chain files. Assumes directory structure
 			as in the Aug2017 runs directory on tsankawi. Output is a python pickle file
@@ -48,6 +66,8 @@ def readRawChain(chainDir,grs = 1, burnIn = 0.5, outDir='data'):
 			grs = index of the grs for this chain (1 or 2)
 		    burnIn = fraction of chain to throw out for burn in
 			outDir = output directory for pickle file (name will be generated automatically)
+			tar = open tarfile containing chainDir (run_r_GPS/...). If given, the chain
+				files are streamed out of the tarball instead of being read from disk
 			Ira Thorpe
 		    2018-05-12
 	"""
@@ -59,46 +79,42 @@ def readRawChain(chainDir,grs = 1, burnIn = 0.5, outDir='data'):
 
 	# load log likelihood chain
 	logLfile = chainDir +'/logLchain.dat'
-	dat = np.loadtxt(logLfile)
-	N_full = np.shape(dat)[0]
-	trim = int(float(N_full) * burnIn);
-	dat = np.delete(dat, np.s_[:trim], axis=0)
+	dat = loadChainFile(logLfile, tar, burnIn = burnIn)
 	N = np.shape(dat)[0]
 
 	# compute detection fraction N_1 / N
 	N_1 = np.sum(dat[:, 0])
 	dfrac =  N_1 / float(N)
 	
-	# load impactChain
+	# load impactChain, the column layout depends on the run (see chainTools.IMPACT_SCHEMAS)
 	impFile = chainDir +'/impactchain.dat'
-	dat = np.loadtxt(impFile)
-	N_imp = np.shape(dat)[0]
-
-	# We only want detections from the end, trim all but N_1
-	trim = int(N_imp - N_1)
-	dat = np.delete(dat, np.s_[:trim], axis=0)
+	if tar is not None:
+		impFile = tarMember(tar, impFile)
+	# We only want detections from the end, only parse the last N_1
+	chain = readImpactChain(impFile, run = run, burnIn = 0.0, lastN = N_1)
 	
-	# build into a dictionary
-	try:
-		t0 = np.median(dat[:,3])
+	# build into a dictionary, the catalog needs the SNR so chains written without it
+	# are kept as empty records like before
+	if len(chain) > 0 and 'snr' in chain:
+		t0 = np.median(chain['t0'])
 		data = {
 			'segment' : gpsTime,
 			'gps' : gpsTime + 1638.4 - t0,
 			'N' : N,
 			'dfrac': dfrac,
-			'logL': dat[:, 0],
-			'snr': dat[:, 1],
-			't0' : -(dat[:, 3] - t0),
-			'Ptot' : dat[:,4],
-			'lat' : 90 - (np.arccos(dat[:,7]) * 180 / np.pi),
-			'lon' : np.mod(dat[:, 8] * 180 / np.pi + 180, 360) - 180,
-			'rx' : dat[:, 10],
-			'ry' : dat[:, 11],
-			'rz' : dat[:, 12],
-			'face' : dat[:, 9],
+			'logL': chain['logL'],
+			'snr': chain['snr'],
+			't0' : -(chain['t0'] - t0),
+			'Ptot' : chain['Ptot'],
+			'lat' : 90 - (np.arccos(chain['costheta']) * 180 / np.pi),
+			'lon' : np.mod(chain['phi'] * 180 / np.pi + 180, 360) - 180,
+			'rx' : chain['rx'],
+			'ry' : chain['ry'],
+			'rz' : chain['rz'],
+			'face' : chain['face'],
 			'run' : run
 			}
-	except:
+	else:
 		t0 = None
 		data = {
 			'segment' : gpsTime,
@@ -129,86 +145,198 @@ runs = ['a', 'b', 'c', 'd', 'e', 'f', 'g',
 		'o', 'p', 'q', 'r', 's', 't', 'u']
 
 logFile = outDir + '/readCatalog.log'#'/local/data/ltpda/work/micrometeoroid/readCatalog.log'
-log = open(logFile,'w+')
-log.write('Logfile for readCatalog.py. Executed at ' + str(datetime.datetime.now())+'\n')
 
-# loop
-ii = 0
-for r in runs:
-	names = fnmatch.filter(os.listdir(baseName),'run_'+ r +'*.tgz')
-	#log.write('Processing run ' + r + '...\n')
-	for n in names:
-		try:
-			# Define Our regular expression to find the GPS time
-			regex = r'run_' + r + r'_(\d*).tgz'
-			GPS = str(getGPS(regex, n))
+# Tarballs that have already been read, keyed by tarball path with size and mtime
+manifestFile = outDir + '/catalogManifest.json'
+
+# Columnar chain stores of the catalog (see chainStore.py), one per GRS
+storeDir = outDir + '_store'
+
 
+def findJobs(log):
+	"""
+		Lists the run_*_<gps>.tgz tarballs in baseName that should be read, skipping
+		the runs that have been replaced by later runs. The directory is scanned once
+		into a runIndex; the supersession and GRS rules live in runIndex.py.
+		Returns a list of (tarball path, run_r_GPS name, grs) tuples.
+	"""
+	index = runIndex(baseName)
 
+	jobs = []
+	for r in runs:
+		for GPS in index.getGPS(r):
 			# Some runs are replaced by later runs
 			# we skip and do not run for those times
-			isreplaced = False
-			replaced = []
-			if r in ['h', 'i', 'q']:
-				replaced = ['r', 't', 'R', 's', 'u', 'S']
-			elif r == 'k':
-				replaced = ['l', 'm']
-			elif r in ['a', 'b', 'c', 'd', 'e']:
-				replaced = ['h', 'i']
-
-			for rep in replaced:
-				fname = baseName + '/run_' + rep + '_' + GPS + '.tgz'
-				if os.path.isfile(fname):
+			replaced = index.replacedBy(GPS, r)
+			if len(replaced) > 0:
+				for rep in replaced:
 					print('in:', r, ' replaced: ', rep)
-					log.write('in: %s, replaced by: %s'%(r, rep))
-					isreplaced = True
-			if isreplaced:
+					log.write('in: %s, replaced by: %s\n'%(r, rep))
 				continue
-					
+
 			# Name of run_r_GPS file without the .tgz
 			filename = 'run_' + r + '_' + GPS
-			print(filename)
 
-			# full name of .tgz files
-			p = baseName + '/' + n
+			jobs.append((index.getTarball(GPS, r), filename, getGRS(r)))
+	return jobs
+
 
-			# Open Tar file
-			tar = tarfile.open(str(p))
+def processTarball(job):
+	"""
+		Reads the chain of a single tarball and writes its pickle to outDir. This is the
+		unit of work handed to the worker processes by buildCatalog.
+		Arguments
+			job = (tarball path, run_r_GPS name, grs) as returned by findJobs
+		Returns (tarball path, process id, bytes read, seconds taken, error or None)
+	"""
+	tarName, filename, grs = job
+	start = time.time()
+	error = None
+	try:
+		# Open Tar file
+		tar = tarfile.open(tarName)
+
+		if streamTar:
+			# read chain file straight from the tarball
+			try:
+				readRawChain(filename, grs, 0.5, outDir, tar = tar)
+			finally:
+				tar.close()
+		else:
 			tar.extract(filename + '/' + 'impactchain.dat', path = tmpDir)
 			tar.extract(filename + '/' + 'logLchain.dat', path = tmpDir)
 			tar.close()
 
-			# load impactChain
-			impFile = chainDir + '/impactchain.dat'
-			try:
-				dat = np.loadtxt(impFile) #pd.read_csv(impFile, delimiter = '\s+')#np.loadtxt(impFile) #, delimiter = '\s')
-				print(r, len(dat[0, :]))
-			except IndexError or KeyError:
-				print(r, 'Empty!')
-			
-			# Define GRS values
-			if r in ['a', 'b', 'c', 'd', 'f', 'h', 
-					'j', 'k', 'l', 'n', 'o', 
-					'q', 'r', 't', 'R']:
-				grs = 1
-			elif r in ['e', 'g', 'i', 'm', 'p', 's', 'u', 'S']:
-				grs = 2
-
 			# read chain file
 			readRawChain(tmpDir + '/' + filename, grs, 0.5, outDir)
 
-			log.write('\tRead chain for ' + filename + '\n')
-
-
 			# clean up file
 			shutil.rmtree(tmpDir + '/' + filename)
-		except:
-			continue
+	except Exception as e:
+		error = repr(e)
+
+	return tarName, os.getpid(), os.path.getsize(tarName), time.time() - start, error
 
-	ii += 1
 
-log.write('\n\nCatalog complete at ' + str(datetime.datetime.now()) + '.\n')
-log.close()
+def tarballStamp(tarName):
+	""" Returns the size and modification time used to tell if a tarball changed """
+	st = os.stat(tarName)
+	return {'size' : st.st_size, 'mtime' : st.st_mtime}
 
 
+def loadManifest():
+	""" Reads the manifest of tarballs already in the catalog """
+	if not os.path.isfile(manifestFile):
+		return {}
+	with open(manifestFile, 'r') as fid:
+		return json.load(fid)
 
 
+def saveManifest(manifest):
+	""" Writes the manifest, replacing the old one only once it is complete """
+	with open(manifestFile + '.tmp', 'w') as fid:
+		json.dump(manifest, fid, indent = 1, sort_keys = True)
+	os.replace(manifestFile + '.tmp', manifestFile)
+
+
+def buildCatalog(nproc = None, rebuild = False, saveEvery = 50):
+	"""
+		Builds the pickle catalog in outDir from the run tarballs in baseName. Reading
+		the chains is spread over a pool of worker processes. A manifest keyed by
+		tarball path, size and mtime is kept in outDir, so a rerun (or a restart after
+		a crash) only reads the tarballs that are new or changed since the last build.
+
+		Arguments
+			nproc = number of worker processes (default: number of cores)
+			rebuild = ignore the manifest and read every tarball again
+			saveEvery = write the manifest after this many finished tarballs
+	"""
+	log = open(logFile,'a+')
+	log.write('Logfile for readCatalog.py. Executed at ' + str(datetime.datetime.now())+'\n')
+
+	if rebuild:
+		manifest = {}
+	else:
+		manifest = loadManifest()
+
+	# only keep tarballs that are not in the manifest or have changed since
+	jobs = findJobs(log)
+	stamps = {}
+	todo = []
+	for job in jobs:
+		stamps[job[0]] = tarballStamp(job[0])
+		if manifest.get(job[0]) != stamps[job[0]]:
+			todo.append(job)
+	print('%i tarballs, %i new or changed'%(len(jobs), len(todo)))
+	log.write('%i tarballs, %i new or changed\n'%(len(jobs), len(todo)))
+
+	# per worker [tarballs, bytes, seconds]
+	workers = {}
+	start = time.time()
+	nDone = 0
+
+	pool = multiprocessing.Pool(nproc)
+	try:
+		for tarName, pid, nbytes, dt, error in pool.imap_unordered(processTarball, todo):
+			filename = os.path.basename(tarName)
+			if error is not None:
+				print('Failed:', filename, error)
+				log.write('\tFailed ' + filename + ': ' + error + '\n')
+				continue
+
+			log.write('\tRead chain for ' + filename + '\n')
+			manifest[tarName] = stamps[tarName]
+
+			stat = workers.setdefault(pid, [0, 0, 0.0])
+			stat[0] += 1
+			stat[1] += nbytes
+			stat[2] += dt
+
+			nDone += 1
+			if nDone % saveEvery == 0:
+				saveManifest(manifest)
+				print('%i / %i tarballs done'%(nDone, len(todo)))
+	finally:
+		pool.close()
+		pool.join()
+		saveManifest(manifest)
+
+	# report throughput of each worker
+	elapsed = time.time() - start
+	log.write('\nRead %i tarballs in %.1f s\n'%(nDone, elapsed))
+	for pid in sorted(workers):
+		n, nbytes, dt = workers[pid]
+		line = ('worker %i: %i tarballs, %.1f MB in %.1f s (%.2f tarballs/s, %.2f MB/s)'
+				%(pid, n, nbytes / 1e6, dt, n / max(dt, 1e-9), nbytes / 1e6 / max(dt, 1e-9)))
+		print(line)
+		log.write('\t' + line + '\n')
+
+	log.write('\n\nCatalog complete at ' + str(datetime.datetime.now()) + '.\n')
+	log.close()
+	return
+
+
+if __name__ == '__main__':
+	parser = ArgumentParser()
+	parser.add_argument("-n", "--nproc", type = int, default = None,
+			help = "number of worker processes, default is the number of cores")
+	parser.add_argument("-r", "--rebuild",
+			help = "ignore the manifest and read every tarball again",
+			action = "store_true")
+	parser.add_argument("-s", "--store",
+			help = "also convert the pickles to chain stores in storeDir_grs1, storeDir_grs2",
+			action = "store_true")
+	parser.add_argument("--reduced",
+			help = "store reduced precision chains (see chainStore.REDUCED_DTYPES)",
+			action = "store_true")
+	parser.add_argument("-c", "--compress", choices = ['zlib', 'zstd'], default = None,
+			help = "compress the chains of the stores in blocks")
+	args = parser.parse_args()
+
+	buildCatalog(nproc = args.nproc, rebuild = args.rebuild)
+
+	if args.store:
+		for grs in [1, 2]:
+			n = buildStore(outDir, storeDir + '_grs%i'%grs, grs = grs,
+					reduced = args.reduced, compress = args.compress)
+			print('wrote %i segments to %s'%(n, storeDir + '_grs%i'%grs))
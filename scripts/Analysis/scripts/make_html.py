@@ -436,6 +436,14 @@ def makeIndex():
 		segments.append(str(p.stem[0:10]))
 	segments = np.sort(segments)
 
+	# each segment is instantiated once, also when it is the neighbour of another page
+	params = {}
+	def getParam(segment):
+		if segment not in params:
+			chainFile = BASE_DIR + DATA_DIR + '/' + str(segment) +'_grs1.pickle'
+			params[segment] = impactClass(chainFile, lazy = True)
+		return params[segment]
+
 	i = -1
 	for s in segments:
 		i += 1
@@ -444,9 +452,9 @@ def makeIndex():
 
 
 		# load GRS1 data
-		chainFile = BASE_DIR + DATA_DIR + '/' + str(segment) +'_grs1.pickle'
 		try:
-			param = impactClass(chainFile)
+			# lazy: only the columns shown in the tables are ever read
+			param = getParam(segment)
 			if not os.path.isdir(BASE_DIR + '/plots/' + param.filename()):
 				continue
 
@@ -465,10 +473,8 @@ def makeIndex():
 			else:
 				next_seg = segments[i + 1]
 
-			chainFilenext = BASE_DIR + DATA_DIR + '/' + str(next_seg) +'_grs1.pickle'
-			chainFileprev = BASE_DIR + DATA_DIR + '/' + str(prev_seg) +'_grs1.pickle'
-			next_param = impactClass(chainFilenext)
-			prev_param = impactClass(chainFileprev)
+			next_param = getParam(next_seg)
+			prev_param = getParam(prev_seg)
 
 			makeParamPage(param, next_param, prev_param)
 			param_list.append(param)
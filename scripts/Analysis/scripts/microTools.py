@@ -29,41 +29,36 @@ def readRawChain(chainDir,grs=1, burnIn=0.5, outDir='data'):
 	import os
 	import pickle
 	import string
+	from chainTools import readChain, readImpactChain
 	
 	# find directory and get gps time
 	base = os.path.basename(chainDir)
 	gpsTime = float(base[len(base)-10:len(base)])
 	
-	# load impactChain
+	# load impactChain, burn in is skipped without being parsed
 	impFile = chainDir +'/impactchain.dat'
-	dat = np.loadtxt(impFile)
-	N = np.shape(dat)[0]
-	trim = int(float(N)*burnIn);
-	dat = np.delete(dat, slice(0, trim), axis=0)
+	chain = readImpactChain(impFile, burnIn = burnIn)
 	
 	# build into a dictionary
-	t0 = np.median(dat[:,3])
+	t0 = np.median(chain['t0'])
 	data = {
 		'segment' : gpsTime,
 		'gps' : gpsTime + 1638.4 - t0,
-		'N' : np.shape(dat)[0],
-		'logL': dat[:, 0],
-		'snr': dat[:, 1],
-		't0' : -(dat[:, 3] - t0),
-		'Ptot' : dat[:, 4], 
-		'lat' : 90-(np.arccos(dat[:,7])*180/np.pi), 
-		'lon' : np.mod(dat[:,8]*180/np.pi+180,360)-180,
-		'rx' : dat[:,10],
-		'ry' : dat[:,11],
-		'rz' : dat[:,12],
-		'face' : dat[:,9]}
+		'N' : len(chain),
+		'logL': chain['logL'],
+		'snr': chain['snr'],
+		't0' : -(chain['t0'] - t0),
+		'Ptot' : chain['Ptot'], 
+		'lat' : 90-(np.arccos(chain['costheta'])*180/np.pi), 
+		'lon' : np.mod(chain['phi']*180/np.pi+180,360)-180,
+		'rx' : chain['rx'],
+		'ry' : chain['ry'],
+		'rz' : chain['rz'],
+		'face' : chain['face']}
 	
 	# load log likelihood chain
 	logLfile = chainDir +'/logLchain.dat'
-	dat = np.loadtxt(logLfile)
-	N = np.shape(dat)[0]
-	trim = int(float(N)*burnIn);
-	dat = np.delete(dat, slice(0, trim), axis=0)
+	dat = readChain(logLfile, burnIn)
 	
 	# compute detection fraction
 	dfrac = np.sum(dat[:,0])/(np.shape(dat)[0])
@@ -76,18 +71,21 @@ def readRawChain(chainDir,grs=1, burnIn=0.5, outDir='data'):
 	return data
 
 # function to get spacecraft quaternions    
-def getSCquats(gps, doText = False):
+def getSCquats(gps, doText = False, interpolate = False):
 	"""
 	function to read SC quaternion file. Can either read a python binary file (faster, 
-	default) or an ASCII text file (slower)
+	default) or an ASCII text file (slower). The file is opened once per process, see
+	attitudeTools
+		gps = GPS time or array of GPS times
+		interpolate = SLERP between the samples around gps instead of taking the nearest one
 	
 	Ira Thorpe
 	2018-05-12
 	"""
 	#import libraries
-	import numpy as np, quaternion
 	import os
 	import pathlib
+	from attitudeTools import getAttitude
 	
 	# get current working directory
 	p = pathlib.PurePath(os.getcwd())
@@ -96,52 +94,28 @@ def getSCquats(gps, doText = False):
 	# load Quaternion data
 	if doText:
 		quatFile = baseDir +'/rawData/allQuats.txt'
-		dat = np.loadtxt(quatFile)
 	else :
 		quatFile = baseDir + '/data/quats.npy'
-		dat = np.load(quatFile)
 		
-	# separate out gps time (1st column) from quaternions (columns 2-5)
-	allGPS = np.array(dat[...,0])
-	allQuats = quaternion.as_quat_array(np.array(dat[...,[4,1,2,3]]))
-	
-	# find nearest gps time
-	idxmin = (np.abs(allGPS-gps)).argmin()
-	impQuat = allQuats[idxmin]
-
-	# return the quaternion
-	return impQuat
+	# quaternion at the nearest gps time
+	return getAttitude(quatFile, doText = doText).getQuats(gps, interpolate = interpolate)
 
 def ECI_to_SUN(gps):
 	"""
-	returns rotation quaternion from ECI to SUN coordinates
+	returns rotation quaternion from ECI to SUN coordinates, or an array of quaternions for
+	an array of gps times (interpolated from the Sun ephemeris table of the data directory)
 
 	"""
-	import numpy as np, quaternion
 	import os
 	import pathlib
-	from astropy.time import Time
-	from astropy.coordinates import get_body
+	from frameTools import ECI_to_SUN as eciToSun, EPHEMERIS_FILE
+
+	# get current working directory
+	p = pathlib.PurePath(os.getcwd())
+	baseDir = str(p.parent)
 
 	# quaternion to rotate from ECI to Sun (place +x in Sunward direction)
-	# Get sun location 
-	s = get_body('sun', Time(gps ,format = 'gps', scale = 'utc'))
-	sun_dec_rad = s.dec.value * np.pi / 180
-	sun_ra_rad = s.ra.value * np.pi / 180
-
-	# unit vector in sunward direction
-	usun = np.array([np.cos(sun_dec_rad) * np.cos(sun_ra_rad),
-				np.cos(sun_dec_rad) * np.sin(sun_ra_rad), 
-				np.sin(sun_dec_rad)])
-	
-	# find quaternion to go between x and sunward direction
-	ux = np.array([1, 0, 0])
-	usun_x_ux = np.cross(usun, ux)
-	qr_ECIx_sun = quaternion.as_quat_array([1 + np.dot(ux, usun),
-										usun_x_ux[0],
-										usun_x_ux[1],
-										usun_x_ux[2]])
-	qr_ECIx_sun = qr_ECIx_sun / quaternion.np.abs(qr_ECIx_sun)
+	qr_ECIx_sun = eciToSun(gps, cacheFile = baseDir + '/data/' + EPHEMERIS_FILE)
 
 	return qr_ECIx_sun
 
@@ -161,59 +135,31 @@ def findSkyAngles(data, CI = 0.68, nside = 32):
 	2018-05-24
 	"""
 	#import libraries
-	import healpy as hp
 	import numpy as np
-	import matplotlib.pyplot as plt
-
-	# Build the HEALPIX map
-	npix = hp.nside2npix(nside)
-	mp = np.arange(npix)
+	from skyTools import skyLocalizer, SKY_CIS
 
-	# Convert data to HEALPIX
-	dat_hp = hp.pixelfunc.ang2pix(nside, data['lon'], data['lat'], nest=False, lonlat=True)
-
-	# Make the histogram
-	bin_edges = np.arange(-0.5, npix + 0.5, 1.0)
-	bin_centers = np.arange(0, npix, 1.0)
-	cnt_hp, bins = np.histogram(dat_hp, bin_edges)
-	
 	# Measure centroid and sky area
-	cdf = np.cumsum(cnt_hp.astype('float')) / float(data['N'])        
-	ilb = (np.abs(cdf - ((1.0 - CI) / 2.0))).argmin()
-	iub = (np.abs(cdf - (1.0 - ((1.0 - CI) / 2.0)))).argmin()
-	imed = (np.abs(cdf - 0.5)).argmin()
-	area = 41253.0 * float(iub - ilb) / float(npix)
-	lon_c, lat_c = hp.pixelfunc.pix2ang(nside, imed, nest = False, lonlat = True)
-	lon_c = np.mod(180 + lon_c, 360) - 180
+	sky = skyLocalizer(data['lon'], data['lat'])
+	lat_c, lon_c, area = sky.locate(data['N'], CI, nside)
 	
 	# put back into data dictionary
-	data['lat_c'] = lat_c
-	data['lon_c'] = lon_c
-	data['skyArea'] = area
-	data['healPix'] = cnt_hp / float(data['N'])
+	data['lat_c'] = lat_c[0]
+	data['lon_c'] = lon_c[0]
+	data['skyArea'] = area[0]
+	data['healPix'] = sky.healPix(data['N'], nside)[0]
+	data['skyAreas'] = dict(zip(SKY_CIS, sky.credibleAreas(SKY_CIS, nside)[0]))
 	
 	# if Sun angles are present, repeat for them
 	if 'lon_sun' in data :
-		# Convert data to HEALPIX
-		dat_hp = hp.pixelfunc.ang2pix(nside, data['lon_sun'], data['lat_sun'], nest = False, lonlat = True)
-
-		# Make the histogram
-		cnt_hp, bins = np.histogram(dat_hp, bin_edges)
-	
-		# Measure sky area
-		cdf = np.cumsum(cnt_hp.astype('float')) / float(data['N'])        
-		ilb = (np.abs(cdf - ((1.0 - CI) / 2.0))).argmin()
-		iub = (np.abs(cdf - (1.0 - ((1.0 - CI) / 2.0)))).argmin()
-		imed = (np.abs(cdf - 0.5)).argmin()
-		area = 41253.0 * float(iub - ilb) / float(npix)
-		lon_c, lat_c = hp.pixelfunc.pix2ang(nside, imed, nest = False, lonlat = True)
-		lon_c = np.mod(180 + lon_c, 360) - 180
+		sky = skyLocalizer(data['lon_sun'], data['lat_sun'])
+		lat_c, lon_c, area = sky.locate(data['N'], CI, nside)
 		
 		# put into dictionary
-		data['lat_c_sun'] = lat_c
-		data['lon_c_sun'] = lon_c
-		data['skyArea_sun'] = area
-		data['healPix_sun'] = cnt_hp / float(data['N'])
+		data['lat_c_sun'] = lat_c[0]
+		data['lon_c_sun'] = lon_c[0]
+		data['skyArea_sun'] = area[0]
+		data['healPix_sun'] = sky.healPix(data['N'], nside)[0]
+		data['skyAreas_sun'] = dict(zip(SKY_CIS, sky.credibleAreas(SKY_CIS, nside)[0]))
 
 	
 	# return dictionary
@@ -10,6 +10,143 @@ import os
 from mpl_toolkits.mplot3d import Axes3D
 import scipy as scp
 
+# version of the compiled model cache, see population.loadCache
+MODEL_CACHE_VERSION = 1
+
+
+class gridFluxMap:
+        """
+                Flux of a model on a regular grid (every combination of the lon, lat [and Ptot]
+                grid values), looked up at the nearest grid point. Gives the same values as a
+                NearestNDInterpolator over the grid points, as the nearest point of a full grid
+                is the nearest value along each axis. The index along uniformly spaced axes
+                (lon, lat) is computed arithmetically, along the others (Ptot) with a binary
+                search of the midpoints, and the flux is gathered from a dense array.
+
+                linear interpolates multilinearly between the grid points instead, uniformly
+                spaced axes in their own units (longitude wrapping around if the axis covers 360
+                degrees) and the others (Ptot) in log10. Outside the grid the edge values are kept.
+        """
+        def __init__(self, points, flux):
+                """
+                        points = tuple of arrays, coordinates of the grid points (lon, lat[, Ptot])
+                        flux = array, flux at the grid points
+                Raises ValueError if the points are not a full grid
+                """
+                points = [np.asarray(x, dtype = float) for x in points]
+                flux = np.asarray(flux, dtype = float)
+
+                axes = [np.unique(x) for x in points]
+                shape = tuple(len(a) for a in axes)
+                if len(flux) != np.prod(shape):
+                        raise ValueError('points are not a full grid')
+
+                index = tuple(np.searchsorted(a, x) for a, x in zip(axes, points))
+                cube = np.full(shape, np.nan)
+                cube[index] = flux
+                if np.any(np.isnan(cube)):
+                        raise ValueError('points are not a full grid')
+                self.setCube(axes, cube)
+
+        @classmethod
+        def fromCube(cls, axes, cube):
+                """ Returns the map of a dense flux array, cube[i, j[, k]] at axes[0][i], axes[1][j]... """
+                self = cls.__new__(cls)
+                self.setCube(axes, cube)
+                return self
+
+        def setCube(self, axes, cube):
+                """ Sets the grid values along each axis and the dense flux array """
+                self.axes = [np.asarray(a, dtype = float) for a in axes]
+                self.cube = np.asarray(cube, dtype = float)
+
+                # start and step of uniform axes, midpoints of the others
+                self.steps = []
+                for a in self.axes:
+                        step = np.diff(a)
+                        if len(a) > 1 and np.allclose(step, step[0]):
+                                self.steps.append((a[0], step[0]))
+                        else:
+                                self.steps.append(None)
+                self.midpoints = [(a[1:] + a[:-1]) / 2 for a in self.axes]
+
+                # interpolation coordinates of the non uniform axes, and whether an axis wraps around
+                self.logAxes = [None if step is not None else np.log10(a) for a, step in zip(self.axes, self.steps)]
+                self.periodic = [step is not None and np.isclose(len(a) * step[1], 360)
+                                                 for a, step in zip(self.axes, self.steps)]
+
+        def axisIndex(self, axis, x):
+                """ Returns the index of the nearest grid value along an axis """
+                n = len(self.axes[axis])
+                if self.steps[axis] is not None:
+                        start, step = self.steps[axis]
+                        return np.clip(np.floor((x - start) / step + 0.5), 0, n - 1).astype(int)
+                return np.searchsorted(self.midpoints[axis], x)
+
+        def __call__(self, *x):
+                """ Returns the flux at the nearest grid point of the points x (lon, lat[, Ptot]) """
+                x = np.broadcast_arrays(*[np.asarray(xi, dtype = float) for xi in x])
+                return self.cube[tuple(self.axisIndex(i, xi) for i, xi in enumerate(x))]
+
+        def axisWeights(self, axis, x):
+                """ Returns the indices of the grid values below and above x along an axis, and the weight of the upper one """
+                n = len(self.axes[axis])
+                if n == 1:
+                        i = np.zeros(np.shape(x), dtype = int)
+                        return i, i, np.zeros(np.shape(x))
+
+                if self.steps[axis] is not None:
+                        start, step = self.steps[axis]
+                        f = (x - start) / step
+                        if self.periodic[axis]:
+                                f = np.mod(f, n)
+                                lower = np.minimum(np.floor(f).astype(int), n - 1)
+                                return lower, (lower + 1) % n, f - lower
+                        lower = np.clip(np.floor(f).astype(int), 0, n - 2)
+                        return lower, lower + 1, np.clip(f - lower, 0, 1)
+
+                grid = self.logAxes[axis]
+                with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                        t = np.log10(x)
+                lower = np.clip(np.searchsorted(grid, t, side = 'right') - 1, 0, n - 2)
+                w = np.clip((t - grid[lower]) / (grid[lower + 1] - grid[lower]), 0, 1)
+                return lower, lower + 1, np.where(np.isnan(w), 0, w)
+
+        def corners(self, *x):
+                """
+                        Returns the grid points around the points x (lon, lat[, Ptot]) as a list of
+                        (index into the flattened cube, weight), one per corner of the grid cell
+                """
+                x = np.broadcast_arrays(*[np.asarray(xi, dtype = float) for xi in x])
+
+                # flattened index and weight of the partial corners, one axis at a time
+                corners = [(0, 1.0)]
+                for axis, xi in enumerate(x):
+                        lower, upper, w = self.axisWeights(axis, xi)
+                        stride = int(np.prod(self.cube.shape[axis + 1:]))
+                        corners = [(index + i * stride, weight * wi) for index, weight in corners
+                                           for i, wi in [(lower, 1 - w), (upper, w)]]
+                return corners
+
+        def linear(self, *x):
+                """ Returns the flux interpolated multilinearly at the points x (lon, lat[, Ptot]) """
+                cube = self.cube.ravel()
+                flux = 0.0
+                for index, weight in self.corners(*x):
+                        flux = flux + weight * np.take(cube, index)
+                return flux
+
+
+def nearestFluxMap(points, flux):
+        """
+                Returns the nearest grid point lookup of a flux model: a gridFluxMap if the points
+                are a full grid, a NearestNDInterpolator otherwise
+        """
+        try:
+                return gridFluxMap(points, flux)
+        except ValueError:
+                return scp.interpolate.NearestNDInterpolator(points, flux)
+
 
 class population:
         """
@@ -20,16 +157,21 @@ class population:
                 - Add Probability function
         """
         ## Private Functions ## 
-        def __init__(self, modelDir, pop_type, usePtot = True):
+        def __init__(self, modelDir, pop_type, usePtot = True, interp = 'nearest'):
                 """
                         modelDir = directory where file is located
                         pop_type = String, Population type, one of 'JFC', 'HTC', 'Uniform', 'AST', 'OCC'
                         usePtot = Whether to integrate momentum out
+                        interp = 'nearest' (flux of the nearest grid point) or 'linear' (multilinear
+                                in lon, lat and log Ptot, see gridFluxMap.linear)
                 """
 
                 # Setting wheter to interpolate with Ptot
                 self.usePtot = usePtot
                 self.pop_type = pop_type
+                if interp not in ['nearest', 'linear']:
+                        raise ValueError('interp not valid: %s'%interp)
+                self.interp = interp
 
                 if pop_type == 'Uniform':
                         dataFile = None
@@ -41,6 +183,10 @@ class population:
                         raise(ValueError)
 
                 self.grid = self.getGrid()
+
+                # compiled model, if the model file did not change since it was written
+                if dataFile is not None and self.loadCache(modelDir, dataFile):
+                        return
                 
                 # For uniform just take the Given Grid
                 if pop_type == 'Uniform':
@@ -71,8 +217,73 @@ class population:
                         print('Ptot has been deleted')
                         self.norm = np.sum(self.getFlux(self.grid['lon'].values, self.grid['lat'].values, norm = False))
 
+                self.saveCache(modelDir, dataFile)
                 return
 
+        def cacheFile(self, modelDir, dataFile):
+                """
+                        Returns the compiled model file of a model file: modelDir/cache/
+                        <dataFile>.<hash of its content>.<ptot or int>.npz
+                """
+                import hashlib
+
+                with open(str(modelDir) + '/' + dataFile, 'rb') as fid:
+                        digest = hashlib.sha1(fid.read()).hexdigest()[:16]
+                mode = 'ptot' if self.usePtot else 'int'
+                return os.path.join(str(modelDir), 'cache', '%s.%s.%s.npz'%(dataFile, digest, mode))
+
+        def saveCache(self, modelDir, dataFile):
+                """
+                        Writes the model (dataframe, dense flux maps and norm) to its compiled
+                        model file. Models that are not on a full grid are not cached.
+                """
+                maps = {'int' : self.flux_map_int}
+                if self.usePtot:
+                        maps['ptot'] = self.flux_map
+                if not all(isinstance(m, gridFluxMap) for m in maps.values()):
+                        return
+
+                arrays = {'version' : MODEL_CACHE_VERSION, 'norm' : self.norm,
+                                'columns' : np.asarray(list(self.df.columns))}
+                for name in self.df.columns:
+                        arrays['df_' + name] = self.df[name].values
+                for key, m in maps.items():
+                        arrays[key + '_cube'] = m.cube
+                        for i, a in enumerate(m.axes):
+                                arrays['%s_axis%i'%(key, i)] = a
+
+                cacheFile = self.cacheFile(modelDir, dataFile)
+                try:
+                        if not os.path.isdir(os.path.dirname(cacheFile)):
+                                os.makedirs(os.path.dirname(cacheFile))
+                        with open(cacheFile + '.tmp', 'wb') as fid:
+                                np.savez(fid, **arrays)
+                        os.replace(cacheFile + '.tmp', cacheFile)
+                except (IOError, OSError):
+                        print('could not write the model cache', cacheFile)
+
+        def loadCache(self, modelDir, dataFile):
+                """
+                        Reads the model from its compiled model file (see saveCache). Returns False if
+                        there is no file for the current content of the model file.
+                """
+                cacheFile = self.cacheFile(modelDir, dataFile)
+                if not os.path.isfile(cacheFile):
+                        return False
+                with np.load(cacheFile) as cache:
+                        if int(cache['version']) != MODEL_CACHE_VERSION:
+                                return False
+                        self.df = pd.DataFrame(dict((name, cache['df_' + name]) for name in cache['columns']))
+                        self.flux_map_int = gridFluxMap.fromCube([cache['int_axis0'], cache['int_axis1']],
+                                        cache['int_cube'])
+                        if self.usePtot:
+                                self.flux_map = gridFluxMap.fromCube([cache['ptot_axis%i'%i] for i in range(3)],
+                                                cache['ptot_cube'])
+                        else:
+                                self.flux_map = self.flux_map_int
+                        self.norm = float(cache['norm'])
+                return True
+
         def getGrid(self):
                 """ Returns our Grid """
                 grid_lon = np.arange(-179, 181, 2)
@@ -80,20 +291,11 @@ class population:
                 grid_Ptot = np.asarray([1e-7, 5e-7, 1e-6, 5e-6, 
                                                                 1e-5, 5e-5, 1e-4, 5e-4, 1e-3]) * 10 ** 6 # Micro Ns
 
-                lon = []
-                lat = []
-                Ptot = []
-                for i in grid_lon:
-                        for j in grid_lat:
-                                # Includes Momentum
-                                if self.usePtot:
-                                        for p in grid_Ptot:
-                                                lon.append(i)
-                                                lat.append(j)
-                                                Ptot.append(p)
-                                else:
-                                        lon.append(i)
-                                        lat.append(j)
+                # every (lon, lat[, Ptot]), lon slowest and Ptot fastest
+                if self.usePtot:
+                        lon, lat, Ptot = [x.ravel() for x in np.meshgrid(grid_lon, grid_lat, grid_Ptot, indexing = 'ij')]
+                else:
+                        lon, lat = [x.ravel() for x in np.meshgrid(grid_lon, grid_lat, indexing = 'ij')]
                 flux = np.zeros(len(lon))
                 
                 if self.usePtot:
@@ -157,7 +359,7 @@ class population:
 
                 # Integrated map
                 df_int = self.integratePtot(self.df.copy())
-                self.flux_map_int = scp.interpolate.NearestNDInterpolator((df_int['lon'].values,
+                self.flux_map_int = nearestFluxMap((df_int['lon'].values,
                                                                                                                           df_int['lat'].values),
                                                                                                                           df_int['flux'].values)
                 if self.usePtot and not integrate_mom:
@@ -165,7 +367,7 @@ class population:
                         print("(lon,lat):",(df_int['lon'].values,df_int['lat'].values))
                         try:
 
-                                self.flux_map = scp.interpolate.NearestNDInterpolator((self.df['lon'].values,
+                                self.flux_map = nearestFluxMap((self.df['lon'].values,
                                                                                                                   self.df['lat'].values,
                                                                                                                   self.df['Ptot'].values),
                                                                                                                   self.df['flux'].values)
@@ -210,7 +412,7 @@ class population:
 
         def getFlux(self, lon, lat, Ptot = None, norm = True):
                 """
-                Returns nearest flux value for the set of longitudes and latitudes
+                Returns nearest (or interpolated, see interp) flux value for the set of longitudes and latitudes
                 lon - scalar or arraylike, set of longitudes
                 lat - scalar or arraylike, set of lattitudes
                 Ptot -> only used if self.usePtot, set of Momenta
@@ -219,16 +421,38 @@ class population:
                 if Ptot is None:
                         # Uses map not interpolated with momentum
                         if norm:
-                                return self.flux_map_int(lon, lat) / self.norm
+                                return self.lookup(self.flux_map_int, lon, lat) / self.norm
                         else: 
-                                return self.flux_map_int(lon, lat)  
+                                return self.lookup(self.flux_map_int, lon, lat)  
 
                 # Used map interpolated with momentum
                 if self.usePtot:
                         if norm:
-                                return self.flux_map(lon, lat, Ptot) / self.norm
+                                return self.lookup(self.flux_map, lon, lat, Ptot) / self.norm
                         else:
-                                return self.flux_map(lon, lat, Ptot)
+                                return self.lookup(self.flux_map, lon, lat, Ptot)
+
+        def lookup(self, fluxMap, *x):
+                """ Evaluates a flux map at x, multilinearly if interp is 'linear' (nearest for maps not on a full grid) """
+                if self.interp == 'linear' and isinstance(fluxMap, gridFluxMap):
+                        return fluxMap.linear(*x)
+                return fluxMap(*x)
+
+        def getGridSum(self, norm = True):
+                """
+                Returns the flux summed over the model grid, p(n = 1 | theta_p). The sum only
+                depends on the population and is computed on the first call.
+                """
+                if not hasattr(self, 'gridFlux'):
+                        if self.usePtot:
+                                flux = self.getFlux(self.grid['lon'].values, self.grid['lat'].values,
+                                                Ptot = self.grid['Ptot'].values, norm = False)
+                        else:
+                                flux = self.getFlux(self.grid['lon'].values, self.grid['lat'].values, norm = False)
+                        self.gridFlux = np.sum(flux)
+                if norm:
+                        return self.gridFlux / self.norm
+                return self.gridFlux
 
         def calc_like_impact(self, impact, norm = True):
                 """
@@ -250,8 +474,8 @@ class population:
                 #impact = impact.SuntoMicro()
 
                 # Gets lon lat in correct frame
-                lons = impact.lat_sun
-                lats = impact.lon_sun
+                lons = impact.lon_sun
+                lats = impact.lat_sun
                 Ptots = impact.Ptot
 
                 if Ptots is None:
@@ -284,8 +508,7 @@ class population:
                 # p(n = 0 | theta_p)
                 # p(n = 0 | theta_p) = 1 - p(n=1|theta_p) 
                 # Sum over all space
-                f_pop_1 = np.sum(self.getFlux(self.grid['lon'].values, self.grid['lat'].values, 
-                                                 Ptot = self.grid['Ptot'].values, norm = norm))
+                f_pop_1 = self.getGridSum(norm = norm)
                 f_pop_0 = (1 - f_pop_1) / p_hat_0
 
                 # Sum p(n = 1, psi | theta_p)
@@ -300,3 +523,114 @@ class population:
 
                 
 
+
+class populationSet:
+        """
+                Several populations evaluated together. The flux cubes of populations on the
+                same grid are stacked into one array [pop x lon x lat (x Ptot)], so the grid index
+                of every sample is computed once and the fluxes of all populations are gathered
+                in one indexing operation.
+        """
+        def __init__(self, populations):
+                """
+                        populations = list of population instances, e.g. [JFC, HTC, AST, OCC, Uniform]
+                """
+                self.populations = list(populations)
+                self.names = [p.pop_type for p in self.populations]
+                self.usePtot = all(p.usePtot for p in self.populations)
+                self.norm = np.asarray([p.norm for p in self.populations], dtype = float)
+                interps = set(p.interp for p in self.populations)
+                self.interp = interps.pop() if len(interps) == 1 else None
+
+                # map -> stacked cube, None if the populations are not all on the same grid
+                self.map_int, self.cube_int = self.stack([p.flux_map_int for p in self.populations])
+                if self.usePtot:
+                        self.map, self.cube = self.stack([p.flux_map for p in self.populations])
+                else:
+                        self.map, self.cube = self.map_int, self.cube_int
+
+        def __len__(self):
+                return len(self.populations)
+
+        def stack(self, maps):
+                """ Returns the first map and the stacked cubes of maps, (None, None) if they differ in grid """
+                if not all(isinstance(m, gridFluxMap) for m in maps):
+                        return None, None
+                axes = maps[0].axes
+                for m in maps[1:]:
+                        if len(m.axes) != len(axes) or not all(a.shape == b.shape and np.allclose(a, b, rtol = 1e-9)
+                                                                                 for a, b in zip(m.axes, axes)):
+                                return None, None
+                return maps[0], np.stack([m.cube for m in maps])
+
+        def getFlux(self, lon, lat, Ptot = None, norm = True):
+                """
+                Returns the nearest (or interpolated) flux values of all populations, array
+                [pop x samples], in the order of the populations (same values as population.getFlux)
+                lon - arraylike, set of longitudes
+                lat - arraylike, set of lattitudes
+                Ptot -> only used if self.usePtot, set of Momenta
+                """
+                if Ptot is None or not self.usePtot:
+                        x = (lon, lat)
+                        fluxMap, cube = self.map_int, self.cube_int
+                else:
+                        x = (lon, lat, Ptot)
+                        fluxMap, cube = self.map, self.cube
+
+                if cube is None or self.interp is None:
+                        flux = np.asarray([p.getFlux(*x, norm = False) for p in self.populations])
+                elif self.interp == 'linear':
+                        cube = cube.reshape(len(self), -1)
+                        flux = 0.0
+                        for index, weight in fluxMap.corners(*x):
+                                flux = flux + weight * np.take(cube, index, axis = 1)
+                else:
+                        x = np.broadcast_arrays(*[np.asarray(xi, dtype = float) for xi in x])
+                        index = tuple(fluxMap.axisIndex(i, xi) for i, xi in enumerate(x))
+                        flux = cube[(slice(None),) + index]
+
+                if norm:
+                        flux = flux / self.norm.reshape((-1,) + (1,) * (flux.ndim - 1))
+                return flux
+
+        def likelihood(self, impacts, norm = True):
+                """
+                Likelihood of every impact under every population, as population.calc_like_impact,
+                with the fluxes of the samples of all impacts looked up in one pass.
+
+                        impacts = list of impactClass (e.g. an impactClassList) in the sun frame
+                        norm says whether or not to use normed probabiliy
+
+                returns array [impacts x populations]
+                """
+                p_hat_1 = 0.5
+                p_hat_0 = 0.5
+
+                # p(n = 0 | theta_p) = 1 - p(n=1|theta_p), once per population
+                f_pop_1 = np.asarray([p.getGridSum(norm = norm) for p in self.populations])
+                f_pop_0 = (1 - f_pop_1) / p_hat_0
+
+                lons = [impact.lon_sun for impact in impacts]
+                N_tot = np.asarray([impact.N for impact in impacts], dtype = float)
+                N_1 = np.asarray([0 if lon is None else len(lon) for lon in lons], dtype = int)
+                N_0 = N_tot - N_1
+                full = np.flatnonzero(N_1 > 0)
+
+                likelihood = (N_0 / N_tot)[:, np.newaxis] * f_pop_0[np.newaxis, :]
+                if len(full) == 0:
+                        return likelihood
+
+                # Sum p(n = 1, psi | theta_p) over the samples of every impact
+                lon = np.concatenate([lons[i] for i in full])
+                lat = np.concatenate([impacts[i].lat_sun for i in full])
+                if self.usePtot:
+                        Ptot = np.concatenate([impacts[i].Ptot for i in full])
+                        f_pop = self.getFlux(lon, lat, Ptot, norm = norm) / p_hat_1
+                else:
+                        f_pop = self.getFlux(lon, lat, norm = norm) / p_hat_1
+                starts = np.concatenate(([0], np.cumsum(N_1[full])[:-1]))
+                sum_pop = np.add.reduceat(f_pop, starts, axis = 1).T
+
+                likelihood[full] += sum_pop / N_1[full][:, np.newaxis]
+                return likelihood
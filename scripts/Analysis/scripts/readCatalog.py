@@ -9,7 +9,7 @@ import matplotlib
 import traceback
 
 import datetime
-from impactClass import impactClass
+from impactClass import impactClass, batchSCtoSun
 from populationClass import population as pop
 from argparse import ArgumentParser
 
@@ -39,7 +39,8 @@ modelDir = BASE_DIR + dataDir + '/models'
 usePtot = True  # Old boolean for ignoring momentum
 pop_names = ['JFC', 'HTC', 'AST', 'OCC', 'Uniform']
 populations = []
-# Takes about 30 seconds to read all populations in
+# Takes about 30 seconds to read all populations in the first time, later runs read
+# the compiled models in modelDir/cache (see population.saveCache)
 for p in pop_names:
 	print(p)
 	populations.append(pop(modelDir = modelDir, pop_type = p, usePtot = True))
@@ -85,6 +86,9 @@ for p in pickles:
 		impact_list = [impact1]
 
 	try:
+		# sun-centered angles of both GRS in one pass
+		batchSCtoSun(impact_list)
+
 		# Make Dual Corner
 		hf = impact1.dualCorner(impact2)
 		hf.savefig(plotDir + '/dualCorner.png', format = 'png')
@@ -107,7 +111,6 @@ for p in pickles:
 			fig.savefig(plotDir + '/flat_LPF_log_GRS%i.png' % (impact.grs),format = 'png')
 			plt.close(fig)
 
-			impact = impact.SCtoSun()
 			fig = impact.plot_populations(populations, norm = True, scale = 'lin', show_impact = True)
 			fig.savefig(plotDir + '/pops_grs%i.png'%(impact.grs), format = 'png')
 			plt.close(fig)
@@ -0,0 +1,103 @@
+# runIndex.py - index of the MCMC run tarballs on the archive
+"""
+runIndex is a python module that indexes the run_<r>_<gps>.tgz tarballs produced by the
+MCMC tool. The archive directory is scanned once and every lookup after that is a
+dictionary lookup, so no file system calls are made per tarball.
+
+It is also the one place where the rules about the runs are declared: which runs are
+superseded by later runs of the same segment, and which GRS each run letter analysed.
+"""
+
+import os
+import re
+
+# Runs that are replaced by later runs of the same segment.
+# If any of the listed runs exists for a segment, the run is skipped
+REPLACED_BY = {
+	'a' : ['h', 'i'],
+	'b' : ['h', 'i'],
+	'c' : ['h', 'i'],
+	'd' : ['h', 'i'],
+	'e' : ['h', 'i'],
+	'h' : ['r', 't', 'R', 's', 'u', 'S'],
+	'i' : ['r', 't', 'R', 's', 'u', 'S'],
+	'q' : ['r', 't', 'R', 's', 'u', 'S'],
+	'k' : ['l', 'm'],
+	}
+
+# GRS analysed by each run letter
+RUN_GRS = {
+	'a' : 1, 'b' : 1, 'c' : 1, 'd' : 1, 'f' : 1, 'h' : 1,
+	'j' : 1, 'k' : 1, 'l' : 1, 'n' : 1, 'o' : 1,
+	'q' : 1, 'r' : 1, 't' : 1, 'R' : 1,
+	'e' : 2, 'g' : 2, 'i' : 2, 'm' : 2, 'p' : 2, 's' : 2, 'u' : 2, 'S' : 2,
+	}
+
+# run_<r>_<gps>.tgz
+TARBALL_REGEX = re.compile(r'^run_([A-Za-z])_(\d+)\.tgz$')
+
+
+def getGRS(run):
+	""" Returns the GRS (1 or 2) analysed by a run letter, None if unknown """
+	return RUN_GRS.get(run)
+
+
+def getReplacements(run):
+	""" Returns the list of runs that supersede a run letter """
+	return REPLACED_BY.get(run, [])
+
+
+class runIndex:
+	"""
+	Index of the run tarballs in a directory, keyed by (GPS, run letter).
+	GPS times are kept as the strings found in the file names.
+	"""
+
+	def __init__(self, baseName):
+		"""
+			baseName = directory holding the run_<r>_<gps>.tgz tarballs
+		"""
+		self.baseName = baseName
+
+		# (gps, run) -> tarball file name
+		self.tarballs = {}
+		# run -> list of gps
+		self.runGPS = {}
+
+		for n in os.listdir(baseName):
+			match = TARBALL_REGEX.match(n)
+			if match is None:
+				continue
+			run, gps = match.groups()
+			self.tarballs[(gps, run)] = n
+			self.runGPS.setdefault(run, []).append(gps)
+
+		for run in self.runGPS:
+			self.runGPS[run].sort()
+
+	def __len__(self):
+		return len(self.tarballs)
+
+	def __contains__(self, key):
+		""" key = (gps, run) """
+		return (str(key[0]), key[1]) in self.tarballs
+
+	def getGPS(self, run):
+		""" Returns the sorted GPS times that have a tarball for this run """
+		return self.runGPS.get(run, [])
+
+	def getTarball(self, gps, run):
+		""" Returns the full path of the tarball for (gps, run), None if there is none """
+		name = self.tarballs.get((str(gps), run))
+		if name is None:
+			return None
+		return self.baseName + '/' + name
+
+	def replacedBy(self, gps, run):
+		""" Returns the runs present in the index that supersede (gps, run) """
+		gps = str(gps)
+		return [rep for rep in getReplacements(run) if (gps, rep) in self.tarballs]
+
+	def isReplaced(self, gps, run):
+		""" True if a later run of the same segment is in the index """
+		return len(self.replacedBy(gps, run)) > 0
@@ -0,0 +1,129 @@
+# segmentIndex.py - cached index of the segment metadata lists
+"""
+segmentIndex is a python module that answers the per segment questions asked of the
+metadata lists in the data directory:
+	impact_list.txt     segments that were looked at, with their isImpact and isGlitch flags
+	segment_list.txt    segments that were searched
+
+The lists are read once per process and kept. Every lookup after that is a dictionary
+lookup, and arrays of segments are answered with a binary search over the sorted segments
+instead of a scan per segment. getSegmentIndex checks the size and modification time of
+the lists and reads them again if they changed.
+"""
+
+import os
+
+import numpy as np
+
+# name of the lists inside the data directory
+IMPACT_LIST = 'impact_list.txt'
+SEGMENT_LIST = 'segment_list.txt'
+
+# data directory -> segmentIndex
+_indexes = {}
+
+
+def fileStamp(fileName):
+	""" Returns the size and modification time used to tell if a list changed """
+	st = os.stat(fileName)
+	return (st.st_size, st.st_mtime)
+
+
+def getSegmentIndex(dataPath):
+	"""
+	Returns the index of the lists in dataPath, shared by the whole process. The index is
+	read again if one of the lists changed since it was read.
+		dataPath = directory holding impact_list.txt and segment_list.txt
+	"""
+	key = os.path.abspath(str(dataPath))
+	index = _indexes.get(key)
+	if index is None or index.isStale():
+		index = segmentIndex(key)
+		_indexes[key] = index
+	return index
+
+
+class segmentIndex:
+	"""
+	Index of impact_list.txt and segment_list.txt. Every query takes a single segment
+	(returns a bool) or an array of segments (returns a bool array).
+	"""
+
+	def __init__(self, dataPath):
+		"""
+			dataPath = directory holding impact_list.txt and segment_list.txt
+		"""
+		import pandas as pd
+
+		self.dataPath = str(dataPath)
+		self.impactFile = os.path.join(self.dataPath, IMPACT_LIST)
+		self.segmentFile = os.path.join(self.dataPath, SEGMENT_LIST)
+		self.stamps = (fileStamp(self.impactFile), fileStamp(self.segmentFile))
+
+		self.df_veto = pd.read_csv(self.impactFile, header = 'infer', delim_whitespace = True)
+		search_times = pd.read_csv(self.segmentFile, header = None, names = ['segment'],
+				delim_whitespace = True)
+
+		# sorted segments of the impact list, the first entry of a segment listed twice wins
+		segments = self.df_veto['segment'].values.astype('int64')
+		self.vetoSegments, first = np.unique(segments, return_index = True)
+		self.impactFlags = self.df_veto['isImpact'].values.astype(bool)[first]
+		self.glitchFlags = self.df_veto['isGlitch'].values.astype(bool)[first]
+		self.rows = dict((s, i) for i, s in enumerate(self.vetoSegments.tolist()))
+
+		# sorted searched segments
+		self.searchSegments = np.unique(search_times['segment'].values.astype('int64'))
+		self.searchSet = set(self.searchSegments.tolist())
+		self.lastSearch = self.searchSegments[-1] if len(self.searchSegments) > 0 else -np.inf
+
+	def isStale(self):
+		""" True if one of the lists changed (or is gone) since it was read """
+		try:
+			return self.stamps != (fileStamp(self.impactFile), fileStamp(self.segmentFile))
+		except OSError:
+			return True
+
+	def lookup(self, segments, flags):
+		""" Returns flags of the impact list for segments, False if not listed """
+		if np.ndim(segments) == 0:
+			row = self.rows.get(int(segments))
+			return False if row is None else bool(flags[row])
+
+		segments = np.asarray(segments).astype('int64')
+		out = np.zeros(segments.shape, dtype = bool)
+		if len(self.vetoSegments) == 0:
+			return out
+		i = np.clip(np.searchsorted(self.vetoSegments, segments), 0, len(self.vetoSegments) - 1)
+		found = self.vetoSegments[i] == segments
+		out[found] = flags[i[found]]
+		return out
+
+	def isImpact(self, segments):
+		""" isImpact flag of the impact list, False if the segment is not listed """
+		return self.lookup(segments, self.impactFlags)
+
+	def isGlitch(self, segments):
+		""" isGlitch flag of the impact list, False if the segment is not listed """
+		return self.lookup(segments, self.glitchFlags)
+
+	def isValidSearch(self, segments):
+		"""
+		True if the segment was searched. Jakes list does not cover all time, segments
+		after the end of the list are kept
+		"""
+		if np.ndim(segments) == 0:
+			return bool(segments > self.lastSearch or int(segments) in self.searchSet)
+
+		segments = np.asarray(segments)
+		searched = np.zeros(segments.shape, dtype = bool)
+		if len(self.searchSegments) > 0:
+			ints = segments.astype('int64')
+			i = np.clip(np.searchsorted(self.searchSegments, ints), 0, len(self.searchSegments) - 1)
+			searched = self.searchSegments[i] == ints
+		return (segments > self.lastSearch) | searched
+
+	def isValid(self, segments):
+		""" True if the segment was searched and is not a glitch """
+		if np.ndim(segments) == 0:
+			return self.isValidSearch(segments) and not self.isGlitch(segments)
+		return self.isValidSearch(segments) & ~self.isGlitch(segments)
@@ -0,0 +1,268 @@
+# skyTools.py - HEALPix sky localization of impact chains
+"""
+skyTools is a python module that bins the sky positions of impact chains on a HEALPix grid
+and measures the sky location and area of the impacts, for one impact or many at once.
+
+The samples of many impacts are given concatenated, with an offsets table: the samples of
+impact i are lon[offsets[i]:offsets[i+1]]. Pixel indices are computed once per nside and
+kept, the histograms of all impacts are made with a single np.bincount, and every
+statistic is evaluated for all impacts together, so measuring again at another confidence
+level only redoes the cumulative sums.
+
+Two kinds of sky area are measured:
+	area            the original findSkyAngles measure: the span between the pixels where
+					the cumulative distribution (in pixel order) crosses (1 - CI) / 2 and
+					1 - (1 - CI) / 2. The centroid is the pixel where it crosses 0.5
+	credibleAreas   greatest probability first: the area of the smallest set of pixels
+					holding a fraction CI of the samples, for several CI in one pass
+"""
+
+import numpy as np
+
+# square degrees on the sky
+SKY_AREA = 41253.0
+
+# confidence levels of credibleAreas
+SKY_CIS = [0.5, 0.68, 0.9, 0.95]
+
+
+class skyLocalizer:
+	"""
+	HEALPix binning of the sky positions of one or many impacts. Pixel indices and
+	histograms are kept per nside.
+	"""
+
+	def __init__(self, lon, lat, offsets = None):
+		"""
+			lon, lat = concatenated longitudes and latitudes of the samples [deg]
+			offsets = int array [nImpacts + 1], first sample of every impact; None if all
+				samples belong to one impact
+		"""
+		self.lon = np.asarray(lon, dtype = float)
+		self.lat = np.asarray(lat, dtype = float)
+		if offsets is None:
+			offsets = [0, len(self.lon)]
+		self.offsets = np.asarray(offsets, dtype = 'int64')
+		self.nImpacts = len(self.offsets) - 1
+
+		# nside -> pixel index of every sample, nside -> histograms
+		self.pix = {}
+		self.hist = {}
+
+	def pixels(self, nside):
+		""" Returns the (ring ordered) pixel index of every sample """
+		import healpy as hp
+
+		if nside not in self.pix:
+			self.pix[nside] = hp.pixelfunc.ang2pix(nside, self.lon, self.lat, nest = False, lonlat = True)
+		return self.pix[nside]
+
+	def counts(self, nside):
+		""" Returns the number of samples of every impact in every pixel, [nImpacts x npix] """
+		import healpy as hp
+
+		if nside not in self.hist:
+			npix = hp.nside2npix(nside)
+			impact = np.repeat(np.arange(self.nImpacts), np.diff(self.offsets))
+			self.hist[nside] = np.bincount(impact * npix + self.pixels(nside),
+					minlength = self.nImpacts * npix).reshape(self.nImpacts, npix)
+		return self.hist[nside]
+
+	def healPix(self, norm, nside = 32):
+		""" Returns the sky maps [nImpacts x npix], counts divided by norm (one per impact) """
+		norm = np.broadcast_to(np.asarray(norm, dtype = float), (self.nImpacts,))
+		return self.counts(nside) / norm[:, np.newaxis]
+
+	def locate(self, norm, CI = 0.68, nside = 32):
+		"""
+		Centroid and sky area of every impact, as measured by findSkyAngles.
+		Arguments
+			norm = number of samples the cumulative distribution is divided by, one per
+				impact (or one for all)
+			CI = confidence interval for sky area
+			nside = HEALPIX number of sides
+		Returns lat_c, lon_c [deg] and area [deg^2], arrays [nImpacts]
+		"""
+		import healpy as hp
+
+		norm = np.broadcast_to(np.asarray(norm, dtype = float), (self.nImpacts,))
+		cdf = np.cumsum(self.counts(nside).astype('float'), axis = 1) / norm[:, np.newaxis]
+		ilb = (np.abs(cdf - ((1.0 - CI) / 2.0))).argmin(axis = 1)
+		iub = (np.abs(cdf - (1.0 - ((1.0 - CI) / 2.0)))).argmin(axis = 1)
+		imed = (np.abs(cdf - 0.5)).argmin(axis = 1)
+
+		npix = cdf.shape[1]
+		area = SKY_AREA * (iub - ilb).astype(float) / float(npix)
+		lon_c, lat_c = hp.pixelfunc.pix2ang(nside, imed, nest = False, lonlat = True)
+		lon_c = np.mod(180 + lon_c, 360) - 180
+		return lat_c, lon_c, area
+
+	def credibleAreas(self, CIs = SKY_CIS, nside = 32):
+		"""
+		Greatest probability first credible areas: the area of the smallest set of pixels
+		holding a fraction CI of the samples of an impact.
+		Returns array [nImpacts x len(CIs)] [deg^2], nan for impacts without samples
+		"""
+		counts = self.counts(nside)
+		npix = counts.shape[1]
+		total = counts.sum(axis = 1).astype(float)
+
+		# cumulative fraction of the pixels sorted from most to least probable
+		frac = np.cumsum(-np.sort(-counts, axis = 1), axis = 1) / np.where(total > 0, total, 1)[:, np.newaxis]
+
+		areas = np.empty((self.nImpacts, len(CIs)))
+		for j, CI in enumerate(CIs):
+			nPix = np.minimum(np.sum(frac < CI - 1e-12, axis = 1) + 1, npix)
+			areas[:, j] = SKY_AREA * nPix / float(npix)
+		areas[total == 0] = np.nan
+		return areas
+
+
+# orders (nside = 2 ** order) of the multi-order maps and the most samples a pixel may hold
+# before it is split into its four children
+MOC_MIN_ORDER = 3
+MOC_MAX_ORDER = 8
+MOC_MAX_SAMPLES = 64
+
+
+def multiOrderMaps(lon, lat, offsets = None, norm = None, minOrder = MOC_MIN_ORDER,
+		maxOrder = MOC_MAX_ORDER, maxSamples = MOC_MAX_SAMPLES):
+	"""
+	Makes the multi-order sky maps of one or many impacts in one pass. Every populated
+	pixel of order minOrder is split into its children as long as it holds more than
+	maxSamples samples and is coarser than maxOrder, so the maps are fine where the
+	samples are dense and coarse elsewhere. Empty pixels are not stored.
+	Arguments
+		lon, lat = concatenated longitudes and latitudes of the samples [deg]
+		offsets = int array [nImpacts + 1], first sample of every impact; None if all
+			samples belong to one impact
+		norm = number of samples the counts are divided by, one per impact (or one for
+			all); default is the number of samples of each impact
+		minOrder, maxOrder = coarsest and finest HEALPix order
+		maxSamples = largest number of samples of a pixel that is not split
+	Returns list of multiOrderMap, one per impact
+	"""
+	import healpy as hp
+
+	lon = np.asarray(lon, dtype = float)
+	if offsets is None:
+		offsets = [0, len(lon)]
+	offsets = np.asarray(offsets, dtype = 'int64')
+	nImpacts = len(offsets) - 1
+	if norm is None:
+		norm = np.diff(offsets)
+	norm = np.broadcast_to(np.asarray(norm, dtype = float), (nImpacts,))
+
+	# nested pixels at the finest order, impact of every sample
+	ipix = hp.pixelfunc.ang2pix(2 ** maxOrder, lon, lat, nest = True, lonlat = True).astype('int64')
+	impact = np.repeat(np.arange(nImpacts, dtype = 'int64'), np.diff(offsets))
+
+	uniq = [[] for i in range(nImpacts)]
+	prob = [[] for i in range(nImpacts)]
+	for order in range(minOrder, maxOrder + 1):
+		if len(ipix) == 0:
+			break
+		# pixel of every sample at this order, made unique across impacts
+		npix = 12 * 4 ** order
+		key = impact * npix + (ipix >> (2 * (maxOrder - order)))
+		keys, inverse, counts = np.unique(key, return_inverse = True, return_counts = True)
+		done = np.ones(len(keys), dtype = bool) if order == maxOrder else counts <= maxSamples
+
+		imp = keys[done] // npix
+		pix = keys[done] % npix
+		p = counts[done] / norm[imp]
+		bounds = np.searchsorted(imp, np.arange(nImpacts + 1))
+		for i in np.flatnonzero(np.diff(bounds)):
+			uniq[i].append(4 * 4 ** order + pix[bounds[i]:bounds[i + 1]])
+			prob[i].append(p[bounds[i]:bounds[i + 1]])
+
+		# samples of the pixels that are split
+		keep = ~done[inverse.ravel()]
+		ipix = ipix[keep]
+		impact = impact[keep]
+
+	maps = []
+	for i in range(nImpacts):
+		if len(uniq[i]) == 0:
+			maps.append(multiOrderMap(np.empty(0, dtype = 'int64'), np.empty(0)))
+		else:
+			maps.append(multiOrderMap(np.concatenate(uniq[i]), np.concatenate(prob[i])))
+	return maps
+
+
+class multiOrderMap:
+	"""
+	Multi-order (MOC) sky map: the probability of the populated pixels only, each at its
+	own resolution. A pixel is identified by its NUNIQ index, 4 * nside**2 + ipix with ipix
+	in NESTED ordering.
+	"""
+
+	def __init__(self, uniq, prob):
+		"""
+			uniq = int64 array of NUNIQ pixel indices
+			prob = probability (fraction of the samples) of every pixel
+		"""
+		self.uniq = np.asarray(uniq, dtype = 'int64')
+		self.prob = np.asarray(prob, dtype = float)
+
+	def __len__(self):
+		return len(self.uniq)
+
+	@property
+	def nbytes(self):
+		return self.uniq.nbytes + self.prob.nbytes
+
+	def orders(self):
+		""" Returns the HEALPix order of every pixel """
+		return (np.floor(np.log2(self.uniq) / 2) - 1).astype(int)
+
+	def ipix(self):
+		""" Returns the NESTED pixel index of every pixel at its own order """
+		return self.uniq - 4 * 4 ** self.orders()
+
+	def areas(self):
+		""" Returns the area of every pixel [deg^2] """
+		return SKY_AREA / (12.0 * 4.0 ** self.orders())
+
+	def density(self):
+		""" Returns the probability per square degree of every pixel """
+		return self.prob / self.areas()
+
+	def toDense(self, nside = 32, nest = False):
+		"""
+		Returns the dense map of probability per pixel at nside (RING ordered unless nest),
+		as findSkyAngles' healPix, e.g. for imshow_hpx. Coarser pixels are spread evenly
+		over their children, finer pixels are summed into their parent.
+		"""
+		import healpy as hp
+
+		order = int(np.log2(nside))
+		orders = self.orders()
+		ipix = self.ipix()
+		dense = np.zeros(12 * 4 ** order)
+
+		fine = orders >= order
+		np.add.at(dense, ipix[fine] >> (2 * (orders[fine] - order)), self.prob[fine])
+
+		for o in np.unique(orders[~fine]):
+			sel = np.flatnonzero(orders == o)
+			n = 4 ** (order - o)
+			children = (ipix[sel][:, np.newaxis] * n + np.arange(n)).ravel()
+			dense[children] += np.repeat(self.prob[sel] / n, n)
+
+		if not nest:
+			dense = dense[hp.pixelfunc.ring2nest(nside, np.arange(len(dense)))]
+		return dense
+
+	def credibleAreas(self, CIs = SKY_CIS):
+		"""
+		Greatest probability first credible areas [deg^2]: the area of the densest pixels
+		holding a fraction CI of the probability, at the resolution of each pixel
+		"""
+		if len(self) == 0:
+			return np.full(len(CIs), np.nan)
+		order = np.argsort(-self.density(), kind = 'mergesort')
+		cumProb = np.cumsum(self.prob[order]) / np.sum(self.prob)
+		cumArea = np.cumsum(self.areas()[order])
+		i = np.minimum(np.searchsorted(cumProb, np.asarray(CIs) - 1e-12), len(self) - 1)
+		return cumArea[i]
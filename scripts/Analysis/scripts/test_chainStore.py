@@ -0,0 +1,64 @@
+# test_chainStore.py - error budget of the reduced precision chain store
+"""
+Checks that the reduced precision store accepts the values the chains are written with
+(%lg, six significant digits), including values that sit exactly on a half quantization
+step. Run with pytest from Analysis/scripts.
+"""
+
+import numpy as np
+
+from chainStore import (storeWriter, chainStore, CHAIN_COLUMNS, REDUCED_DTYPES,
+		REDUCED_QUANTIZE, quantizeBudget)
+
+
+def gFormat(values):
+	""" Returns the values as read back from a chain file written with %lg """
+	return np.array(['%g' % x for x in values], dtype = float)
+
+
+def reducedWriter(tmp_path):
+	return storeWriter(str(tmp_path / 'store'), dtypes = REDUCED_DTYPES, quantize = REDUCED_QUANTIZE)
+
+
+def test_half_step_values(tmp_path):
+	writer = reducedWriter(tmp_path)
+	halfSteps = [57.2755, 12.0005, -3.0005, 0.0005, 999.9995, -123456.5]
+	for name in REDUCED_QUANTIZE:
+		step = REDUCED_QUANTIZE[name]
+		stored = writer.encode(name, halfSteps)
+		atol, rtol = quantizeBudget(step)
+		err = np.abs(stored * step - np.asarray(halfSteps))
+		assert np.all(err <= atol + rtol * np.abs(halfSteps))
+
+
+def test_g_formatted_values(tmp_path):
+	rng = np.random.default_rng(0)
+	writer = reducedWriter(tmp_path)
+	values = {
+		'snr' : gFormat(rng.uniform(0, 1000, 100000)),
+		'logL' : gFormat(-10 ** rng.uniform(0, 6, 100000)),
+		}
+	for name, x in values.items():
+		writer.encode(name, x)
+		assert writer.maxError[name] <= quantizeBudget(REDUCED_QUANTIZE[name])[0]
+
+
+def test_reduced_round_trip(tmp_path):
+	rng = np.random.default_rng(1)
+	n = 1000
+	data = dict((name, gFormat(rng.uniform(-90, 90, n))) for name in CHAIN_COLUMNS)
+	for name in ['rx', 'ry', 'rz']:
+		data[name] = gFormat(rng.uniform(-0.5, 0.5, n))
+	data['face'] = rng.integers(0, 10, n).astype(float)
+	data['snr'] = np.full(n, 57.2755)
+	data.update({'segment' : 1143000000.0, 'gps' : 1143000006.0, 'N' : 2 * n, 'dfrac' : 0.5, 'run' : 'c'})
+
+	writer = reducedWriter(tmp_path)
+	writer.append(data)
+	writer.close()
+
+	store = chainStore(str(tmp_path / 'store'))
+	for name in REDUCED_QUANTIZE:
+		atol, rtol = quantizeBudget(REDUCED_QUANTIZE[name])
+		err = np.abs(store.getChain(1143000000.0, name) - data[name])
+		assert np.all(err <= atol + rtol * np.abs(data[name]))
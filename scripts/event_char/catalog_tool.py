@@ -28,6 +28,10 @@ from os.path import relpath
 import re
 import tarfile
 
+# the shared chain reader lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Analysis', 'scripts'))
+from chainTools import readImpactChain
+
 ############################################
 ## initilize catalog
 
@@ -226,23 +230,14 @@ def event_stat(filename, generateHTML = False):
    par = {}
    #all_par = ['like', 'num_imp', 't', 'p', 'unknown1', 'unknown2', 'lat', 'lon', 'face', 'x', 'y', 'z']
    all_par = ['t', 'p', 'lat', 'lon', 'x', 'y', 'z']
-   cols = [2,3,6,7,9,10,11]
-   for i in all_par:
-      par[i] = []
+   cols = ['t0', 'Ptot', 'costheta', 'phi', 'rx', 'ry', 'rz']
+   #cut data size in half to allow for burn in, only the second half is parsed
+   data = readImpactChain('/'.join(['data', filename, 'impactchain.dat']), run = 'e', burnIn = .5, columns = cols)
+   for ind in range(len(all_par)):
+      par[all_par[ind]] = data[cols[ind]]
    keys = []
    for i in par.keys():
       keys.append(i)
-   with open('/'.join(['data', filename, 'impactchain.dat']), 'r') as file:
-      data = file.readlines()
-   #cut data size in half to allow for burn in
-   data = data[int(len(data)/2):len(data)]
-   for j in range(len(data)):
-      data[j] = data[j].strip()
-      data[j] = data[j].split()
-      ind = 0
-      for i in keys:
-         par[i].append(float(data[j][cols[ind]]))
-         ind = ind + 1
    ## chanege x, y, z to r, theta, phi
    r, theta, phi = cartToSphere(par['x'], par['y'], par['z'])
    newcoord = ['r', 'theta', 'phi']
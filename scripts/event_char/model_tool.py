@@ -18,6 +18,10 @@ import sys
 import os
 import bisect 
 
+# the shared chain reader lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Analysis', 'scripts'))
+from chainTools import readImpactChain
+
 ############################################
 ## read in files
 
@@ -289,9 +293,9 @@ if __name__ == '__main__':
       data = pd.read_csv(''.join(['sky_angles/meteor/orientation/', iter]), sep = ' ', names = ['lat', 'lon'])
       events[iter]['lat'].extend(data.lat)
       events[iter]['lon'].extend(data.lon)
-      data = pd.read_csv(''.join(['data/', iter.split('.dat')[0], '/impactchain.dat']), sep = ' ', names = ['logL', 'num', 't', 'p', 'u1', 'u2', 'lat', 'lon', 'face', 'x', 'y', 'z'])
-      data = data[int(len(data)/2):len(data)]
-      events[iter]['p'].extend(data.p)
+      chain = readImpactChain(''.join(['data/', iter.split('.dat')[0], '/impactchain.dat']), run = 'e',
+            burnIn = .5, columns = ['Ptot'])
+      events[iter]['p'].extend(chain['Ptot'])
       rate(event = events[iter], time = iter, mass = mass, flux = flux, JFC = JFC, HTC = HTC)
       print('chain', tind, 'out of', len(files), 'completed')
       tind = tind + 1
@@ -21,6 +21,10 @@ import os
 import sys
 from catalog_tool import CI
 
+# the shared chain reader lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Analysis', 'scripts'))
+from chainTools import readImpactChain
+
 ############################################
 ## read in necessary data
 
@@ -43,11 +47,11 @@ for iter in files:
    data = pd.read_csv(''.join(['sky_angles/meteor/orientation/', iter]), sep = ' ', names = ['lat', 'lon'])
    angles[iter]['rotlat'].extend(data.lat)
    angles[iter]['rotlon'].extend(data.lon)
-   data = pd.read_csv(''.join(['data/', iter.split('.dat')[0], '/impactchain.dat']), sep = ' ', names = ['logL', 'num', 't', 'p', 'u1', 'u2', 'lat', 'lon', 'face', 'x', 'y', 'z'])
-   data = data[int(len(data)/2):len(data)]
-   length.append(len(data))
-   angles[iter]['lat'].extend(data.lat)
-   angles[iter]['lon'].extend(data.lon)
+   chain = readImpactChain(''.join(['data/', iter.split('.dat')[0], '/impactchain.dat']), run = 'e',
+         burnIn = .5, columns = ['costheta', 'phi'])
+   length.append(len(chain))
+   angles[iter]['lat'].extend(chain['costheta'])
+   angles[iter]['lon'].extend(chain['phi'])
 
 print('reading in rate data for both models')
 
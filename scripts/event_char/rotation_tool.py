@@ -18,6 +18,10 @@ import sys
 import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
 
+# the shared chain reader lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Analysis', 'scripts'))
+from chainTools import readImpactChain
+
 ############################################
 ## read in necessary data
 
@@ -240,12 +244,12 @@ if __name__ == '__main__':
       for j in ['t', 'lat', 'lon']:
          events[i][j] = []
    for iter in files:
-      data = pd.read_csv(''.join(['data/', iter, '/impactchain.dat']), sep = ' ', names = ['logL', 'num', 't', 'p', 'u1', 'u2', 'coslat', 'lon', 'face', 'x', 'y', 'z'])
-      data = data[int(len(data)/2):len(data)]
-      events[iter]['lat'].extend(data.coslat)
-      events[iter]['lon'].extend(data.lon)
+      chain = readImpactChain(''.join(['data/', iter, '/impactchain.dat']), run = 'e', burnIn = .5,
+            columns = ['t0', 'costheta', 'phi'])
+      events[iter]['lat'].extend(chain['costheta'])
+      events[iter]['lon'].extend(chain['phi'])
       time = float(iter.split('run_e_')[1])
-      events[iter]['t'].extend(data.t + time)
+      events[iter]['t'].extend(chain['t0'] + time)
    check = input('do you want to check the rotations before implementing for all MCMC output in data/ subdirectories? if yes, then the rotations will be performed on the LPF z-vector (sun) for the second half of the mission attitude quaternions [yes or no]: ')
    if check == 'yes':
       checkz()
@@ -6,8 +6,13 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 import os
+import sys
 import matplotlib.colors as colors
 
+# the shared chain reader lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Analysis', 'scripts'))
+from chainTools import readLineChains
+
 
 def error_hists(pathto, currun,savedirrun,savedirmom, snrpass, make_peak, make_amp, make_q):
 	
@@ -42,39 +47,22 @@ def error_hists(pathto, currun,savedirrun,savedirmom, snrpass, make_peak, make_a
 	#Degrees of Freedom
 	channels = [0,1,2,3,4,5]
 	name_channel = ['Snx','Sny', 'Snz', 'Sntheta', 'Sneta','Snphi']
+
+	#Where the data is stored, files are set up as n F1,A1,Q1: F2,A2,Q2
+	#All channels are parsed at once, in parallel
+	freqnames = [pathto + '/run_e_%s/linechain_channel%s.dat'%(currun,c) for c in channels]
+	linechains = readLineChains(freqnames)
 	
 	#Goes through channels one at a time
 	for c in channels:
 
-		#Where the data is stored 
-		freqname = pathto + '/run_e_%s/linechain_channel%s.dat'%(currun,c)
 		print(name_channel[c])
 
-		#Initializing Arrays
-		freq = []  # Frequency
-		amp  = []  # Amplitude
-		q    = []  # Width
-		
-		#Opens file and goes through Line by Line
-		with open(freqname) as f:
-			for line in f:
-				n = int(line[0])
-
-				#If the line begins with 0, skip the line
-				if n ==0:
-					pass
-				else:
-					#Splt the line after every space
-					liststrings = line.split() 
-					t = 0
-					
-					#Adds each 3rd to the list; files are set up as n F1,A1,Q1: F2,A2,Q2		
-					for i in np.arange(0,n):
-						freq.append(float(liststrings[t+1]))
-						amp.append(float(liststrings[t+2]))
-						q.append(float(liststrings[t+3]))	
-						q_index = t+3
-						t = q_index
+		#Frequency, Amplitude, Width of every line in the chain
+		lines, rows = linechains[c]
+		freq = lines[:, 0]
+		amp  = lines[:, 1]
+		q    = lines[:, 2]
 		
 		#Binnumber is sqrt(length of Freq) or 1
 		binnum = max(int(np.sqrt(len(freq))),1)
@@ -44,6 +44,16 @@ import gc
 from datetime import datetime, timedelta
 import copy
 import argparse
+import sys
+
+# the shared chain reader lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Analysis', 'scripts'))
+from chainTools import readImpactChain
+
+# names used by these plots for the impactchain.dat columns (see chainTools.IMPACT_SCHEMAS)
+CHAIN_NAMES = {'logL' : 'logp', 'snr' : 'SNR', 'N' : 'impactnum', 't0' : 'time', 'Ptot' : 'mom',
+		'map0' : 'whatever', 'map1' : 'who??', 'costheta' : 'coslat', 'phi' : 'longi', 'face' : 'face',
+		'rx' : 'xloc', 'ry' : 'yloc', 'rz' : 'zloc'}
 
 
 #############################################Define Where the REU Folder is!!!###################################
@@ -391,16 +401,13 @@ for direc in directories:
 	impactname = direc + '/impactchain.dat'
 	
 	#### Import Data ####
-	if 'e' in letter:
-	    df = pd.read_csv(impactname, header = None,delimiter = '\s+',
-	    names = ['logp','impactnum','time','mom','whatever','who??','coslat', 'longi', 'face', 'xloc','yloc','zloc'])#, skiprows = int(len(index)/2))
-	else: 
-	    df = pd.read_csv(impactname, header = None,delimiter = '\s+',
-	    names = ['logp','SNR','impactnum','time','mom','whatever','who??','coslat', 'longi', 'face', 'xloc','yloc','zloc'])#, skiprows = int(len(index)/2))
-
-	#Only reads second 1/2 of Data, MCMC burn in
-	print("Length of dataframe = %s"%(len(df['impactnum'])))
-	df = df.tail(n = int(len(df['impactnum'])/2))
+	#Only reads second 1/2 of Data, MCMC burn in is skipped without being parsed
+	#The column layout (with or without SNR) is sniffed from the file
+	chain = readImpactChain(impactname, run = rundir[4], burnIn = .5)
+	N_full = chain.N_full
+	chainindex = np.arange(N_full - len(chain), N_full)
+	df = chain.toDataFrame(rename = CHAIN_NAMES, index = chainindex)
+	print("Length of dataframe = %s"%(N_full))
 	#print('DF length = %s'%(len(df['impactnum'])))
 
 	#Find Median Momentum for title